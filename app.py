@@ -1,33 +1,67 @@
 import os
+import sys
+import platform
+import traceback
+import shutil
+import glob
+import time
 import streamlit as st
 from dotenv import load_dotenv
 from datetime import datetime
-from openai import OpenAI
+from pathlib import Path
 import json
+import logging
+import re
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from importlib.metadata import version, PackageNotFoundError
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# Saída dos logs da aplicação (o nível de documents.py vem de SAORI_LOG_LEVEL).
+# basicConfig não faz nada se o logger raiz já tiver handlers, como após um hot-reload
+logging.basicConfig(stream=sys.stdout, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
 
 # Importar sistema de documentos
-from documents import get_document_processor, get_relevant_knowledge, add_document_from_upload, rebuild_document_index
+from documents import get_document_processor, get_relevant_knowledge, add_document_from_upload, rebuild_document_index, reprocess_all_documents, load_json_file
+from documents import DOCUMENTS_DIR, CHUNKS_DIR, INDEX_FILE, CORPUS_EMBEDDINGS_FILE, CORPUS_REFS_FILE, QUERY_EMBEDDINGS_CACHE
+from documents import _close_query_cache
 
 # Importar prompts
 from prompts import SYSTEM_PROMPT, TEST_MODE_PROMPT
 
 # Log para diagnóstico
 print("Inicializando aplicação...")
-print(f"Python version: {os.sys.version}")
-try:
-    client = OpenAI()
-    print(f"OpenAI versão 1.x instalada com sucesso!")
-except Exception as e:
-    print(f"Erro ao importar OpenAI: {e}")
+print(f"Python version: {sys.version}")
 print(f"Streamlit version: {st.__version__}")
 
+@st.cache_resource(show_spinner=False)
+def load_environment():
+    """
+    Carrega as variáveis de ambiente do arquivo .env uma única vez por processo.
+    
+    Returns:
+        Chave da API OpenAI configurada no ambiente (ou string vazia)
+    """
+    load_dotenv()
+    print("Variáveis de ambiente carregadas")
+    return os.getenv("OPENAI_API_KEY", "")
+
 # Carregar variáveis de ambiente do arquivo .env
-load_dotenv()
-print("Variáveis de ambiente carregadas")
+ENV_API_KEY = load_environment()
+
+def set_api_key(api_key):
+    """Atualiza a chave API da sessão e a versão mascarada exibida na barra lateral."""
+    st.session_state.openai_api_key = api_key
+    st.session_state.openai_api_key_masked = "•" * 20 + api_key[-5:] if len(api_key) > 5 else ""
 
 # Inicializar estados da sessão para a chave API
 if "openai_api_key" not in st.session_state:
-    st.session_state.openai_api_key = os.getenv("OPENAI_API_KEY", "")
+    set_api_key(ENV_API_KEY)
     print(f"API key encontrada no .env: {'Sim' if st.session_state.openai_api_key else 'Não'}")
 
 # Configurar a API key do OpenAI a partir da sessão (será atualizada pela interface se necessário)
@@ -44,32 +78,218 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_resource(max_entries=8)
+def get_openai_client(api_key):
+    """
+    Retorna um cliente OpenAI reutilizado entre reruns do Streamlit.
+    
+    O cliente mantém o pool de conexões HTTP, evitando um novo handshake
+    TLS a cada mensagem. É criado um cliente por chave API; clientes de
+    chaves substituídas são descartados quando o cache enche.
+    
+    Args:
+        api_key: Chave da API OpenAI
+        
+    Returns:
+        Instância de OpenAI
+    """
+    # Importado aqui para não pagar o custo na inicialização; executa uma vez por chave
+    from openai import OpenAI
+    return OpenAI(api_key=api_key)
+
 def get_completion(messages, model="gpt-3.5-turbo"):
     """
-    Obter resposta do modelo OpenAI usando a nova sintaxe
+    Obter resposta do modelo OpenAI em streaming usando a nova sintaxe
     
     Args:
         messages: Lista de mensagens no formato esperado pela API
         model: Modelo OpenAI a ser usado
         
-    Returns:
-        Texto da resposta do modelo
+    Yields:
+        Trechos do texto da resposta à medida que são gerados
     """
     try:
         if not st.session_state.openai_api_key:
-            return "⚠️ API key não configurada! Por favor, configure a chave da API OpenAI."
+            yield "⚠️ API key não configurada! Por favor, configure a chave da API OpenAI."
+            return
             
-        # Usar a chave API da sessão
-        client = OpenAI(api_key=st.session_state.openai_api_key)
+        # Usar o cliente em cache para a chave API da sessão
+        client = get_openai_client(st.session_state.openai_api_key)
         
-        response = client.chat.completions.create(
+        stream = client.chat.completions.create(
             model=model,
             messages=messages,
             temperature=0.7,
+            stream=True,
         )
-        return response.choices[0].message.content
+        for chunk in stream:
+            if chunk.choices:
+                yield chunk.choices[0].delta.content or ""
     except Exception as e:
-        return f"Erro ao comunicar com a API OpenAI: {str(e)}"
+        yield f"Erro ao comunicar com a API OpenAI: {str(e)}"
+
+def write_stream(stream):
+    """
+    Exibe um stream de texto incrementalmente e retorna o texto completo.
+    
+    Equivalente ao st.write_stream, que não existe no Streamlit 1.28.
+    
+    Args:
+        stream: Iterável de trechos de texto
+        
+    Returns:
+        Texto completo exibido
+    """
+    placeholder = st.empty()
+    response = ""
+    for chunk in stream:
+        response += chunk
+        placeholder.markdown(response + "▌")
+    placeholder.markdown(response)
+    return response
+
+@st.cache_resource
+def get_executor():
+    """Retorna um pool de threads compartilhado entre reruns para tarefas de I/O."""
+    return ThreadPoolExecutor(max_workers=4)
+
+@st.cache_data(ttl=3600, max_entries=256, show_spinner=False)
+def cached_relevant_knowledge(key, index_mtime):
+    """
+    Versão em cache de get_relevant_knowledge para perguntas repetidas.
+    
+    Args:
+        key: Pergunta normalizada (sem espaços nas pontas e em minúsculas)
+        index_mtime: Data de modificação do arquivo de índice (invalida o cache quando os documentos mudam)
+        
+    Returns:
+        String contendo o conhecimento relevante
+    """
+    return get_relevant_knowledge(key)
+
+# Separador fixo entre as instruções e o conhecimento: tudo até ele é igual em todos os turnos
+KNOWLEDGE_SEPARATOR = "\n---\n"
+
+def compose_system_message(knowledge):
+    """
+    Monta o conteúdo da mensagem de sistema.
+    
+    O SYSTEM_PROMPT fixo e o separador vêm sempre primeiro e só o conhecimento
+    varia no final, para que o prefixo da requisição seja idêntico entre turnos
+    e aproveite o cache de prompt da OpenAI.
+    
+    Args:
+        knowledge: Conhecimento relevante retornado pela busca
+        
+    Returns:
+        Conteúdo da mensagem de sistema
+    """
+    return SYSTEM_PROMPT + KNOWLEDGE_SEPARATOR + knowledge
+
+def get_index_mtime():
+    """Retorna a data de modificação do arquivo de índice (0 se não existir)."""
+    try:
+        return os.path.getmtime(INDEX_FILE)
+    except OSError:
+        return 0
+
+@st.cache_data
+def cached_document_list(index_mtime):
+    """
+    Retorna a lista de documentos, relida do disco apenas quando o índice muda.
+    
+    Args:
+        index_mtime: Data de modificação do arquivo de índice (usada como chave do cache)
+        
+    Returns:
+        Lista de documentos do índice
+    """
+    return get_document_processor().get_document_list()
+
+# Rótulos exibidos para cada tipo de arquivo
+FILE_TYPE_LABELS = {
+    "pdf": "📄 PDF",
+    "docx": "📝 DOCX",
+    "txt": "📃 TXT/MD",
+    "md": "📃 TXT/MD",
+}
+
+def file_type_label(file_type):
+    """Retorna o rótulo exibido para um tipo de arquivo."""
+    return FILE_TYPE_LABELS.get(file_type, "📁 Arquivo")
+
+@st.cache_data
+def document_display_rows(index_mtime):
+    """
+    Pré-formata as colunas da lista de documentos, em cache enquanto o índice não mudar.
+    
+    Args:
+        index_mtime: Data de modificação do arquivo de índice (usada como chave do cache)
+        
+    Returns:
+        Dicionário de listas paralelas: ids, labels, titles, descriptions e dates
+    """
+    doc_list = cached_document_list(index_mtime)
+    return {
+        "ids": [doc["id"] for doc in doc_list],
+        "labels": [file_type_label(doc["file_type"]) for doc in doc_list],
+        "titles": [doc["title"] for doc in doc_list],
+        "descriptions": [doc.get('description', '')[:100] for doc in doc_list],
+        "dates": [doc.get('added_date', '').split('T')[0] for doc in doc_list],
+    }
+
+def invalidate_document_caches():
+    """Descarta a lista de documentos e o conhecimento em cache após alterações nos documentos."""
+    cached_document_list.clear()
+    document_display_rows.clear()
+    cached_relevant_knowledge.clear()
+
+@st.cache_data
+def json_entry_count(path, mtime):
+    """
+    Conta as entradas de um arquivo JSON, em cache enquanto o arquivo não mudar.
+    
+    Args:
+        path: Caminho do arquivo JSON
+        mtime: Data de modificação do arquivo (usada como chave do cache)
+        
+    Returns:
+        Número de entradas, ou None se o arquivo for inválido
+    """
+    try:
+        return len(load_json_file(path))
+    except (OSError, ValueError, TypeError):
+        return None
+
+@st.cache_resource
+def init_storage():
+    """Cria as pastas de documentos e o arquivo de índice, se não existirem (uma vez por processo)."""
+    Path(DOCUMENTS_DIR).mkdir(parents=True, exist_ok=True)
+    Path(CHUNKS_DIR).mkdir(parents=True, exist_ok=True)
+    
+    # Inicializar o arquivo de índice apenas se não existir (criação exclusiva, sem verificação prévia)
+    try:
+        with open(INDEX_FILE, 'x') as f:
+            f.write('{}')
+    except FileExistsError:
+        pass
+    return True
+
+# Callbacks de widgets: executados antes da reexecução do script, então o
+# novo estado já vale para toda a página sem precisar de st.rerun()
+def submit_api_key(input_key):
+    """Salva a chave API digitada no campo identificado por input_key, se houver."""
+    api_key = st.session_state.get(input_key, "")
+    if api_key:
+        set_api_key(api_key)
+
+def select_tab(tab):
+    """Alterna a guia ativa."""
+    st.session_state.active_tab = tab
+
+def clear_messages():
+    """Limpa o histórico da conversa."""
+    st.session_state.messages = []
 
 def main():
     # Interface para inserir a chave API se não estiver configurada
@@ -80,19 +300,15 @@ def main():
         
         # Criar um formulário para a chave API
         with st.form("api_key_form"):
-            api_key = st.text_input("Chave da API OpenAI:", 
-                                    type="password", 
-                                    help="Insira sua chave API da OpenAI (começa com 'sk-')")
+            st.text_input("Chave da API OpenAI:", 
+                          type="password", 
+                          key="api_key_input",
+                          help="Insira sua chave API da OpenAI (começa com 'sk-')")
             
-            submit = st.form_submit_button("Salvar Chave API")
+            # O callback salva a chave antes da reexecução, dispensando um rerun explícito
+            submit = st.form_submit_button("Salvar Chave API", on_click=submit_api_key, args=("api_key_input",))
             
-            if submit and api_key:
-                # Salvar a chave API na sessão
-                st.session_state.openai_api_key = api_key
-                # Atualizar configuração da OpenAI
-                st.success("✅ Chave API configurada com sucesso!")
-                st.experimental_rerun()
-            elif submit:
+            if submit:
                 st.warning("Por favor, insira uma chave API válida")
         
         # Mostrar instruções alternativas para usar arquivo .env
@@ -116,18 +332,8 @@ def main():
     if "active_tab" not in st.session_state:
         st.session_state.active_tab = "chat"
     
-    # Verificar se a pasta de documentos existe
-    if not os.path.exists("documents"):
-        os.makedirs("documents")
-        
-    # Verificar se a pasta de chunks existe
-    if not os.path.exists("document_chunks"):
-        os.makedirs("document_chunks")
-    
-    # Inicializar o arquivo de índice se não existir
-    if not os.path.exists("document_index.json"):
-        with open("document_index.json", 'w') as f:
-            f.write('{}')
+    # Garantir pastas e arquivo de índice (executado uma vez por processo)
+    init_storage()
     
     # Barra lateral para configurações
     with st.sidebar:
@@ -135,36 +341,28 @@ def main():
         
         # Opção para reconfigurar a chave API
         if st.expander("Configuração da API"):
-            current_key_masked = "•" * 20 + st.session_state.openai_api_key[-5:] if len(st.session_state.openai_api_key) > 5 else ""
-            st.text(f"Chave atual: {current_key_masked}")
+            st.text(f"Chave atual: {st.session_state.openai_api_key_masked}")
             
             # Formulário para alterar a chave
             with st.form("update_api_key"):
-                new_key = st.text_input("Nova chave API:", type="password")
-                update_key = st.form_submit_button("Atualizar")
+                new_key = st.text_input("Nova chave API:", type="password", key="new_api_key_input")
+                update_key = st.form_submit_button("Atualizar", on_click=submit_api_key, args=("new_api_key_input",))
                 
                 if update_key and new_key:
-                    st.session_state.openai_api_key = new_key
                     st.success("Chave atualizada!")
-                    st.experimental_rerun()
         
         # Botões para alternar entre guias
         tab_col1, tab_col2, tab_col3 = st.columns(3)
         with tab_col1:
-            if st.button("💬 Chat", use_container_width=True):
-                st.session_state.active_tab = "chat"
+            st.button("💬 Chat", use_container_width=True, on_click=select_tab, args=("chat",))
         with tab_col2:
-            if st.button("📚 Documentos", use_container_width=True):
-                st.session_state.active_tab = "docs"
+            st.button("📚 Documentos", use_container_width=True, on_click=select_tab, args=("docs",))
         with tab_col3:
-            if st.button("🔧 Debug", use_container_width=True):
-                st.session_state.active_tab = "debug"
+            st.button("🔧 Debug", use_container_width=True, on_click=select_tab, args=("debug",))
         
         # Botão para limpar conversa (somente visível na guia chat)
         if st.session_state.active_tab == "chat":
-            if st.button("Limpar Conversa", use_container_width=True):
-                st.session_state.messages = []
-                st.experimental_rerun()
+            st.button("Limpar Conversa", use_container_width=True, on_click=clear_messages)
             
         st.divider()
         st.caption("Saori - Versão 1.1 • 2025")
@@ -209,71 +407,187 @@ def show_documents_interface():
                     )
                     
                     if success:
+                        invalidate_document_caches()
                         st.success(message)
                     else:
                         st.error(message)
     
     # Listar documentos existentes
     st.subheader("Documentos Disponíveis")
-    doc_list = doc_processor.get_document_list()
+    rows = document_display_rows(get_index_mtime())
     
-    if not doc_list:
+    if not rows["ids"]:
         st.info("Nenhum documento encontrado. Adicione documentos para aumentar o conhecimento de Saori.")
     else:
         # Criar tabela de documentos
-        for idx, doc in enumerate(doc_list):
-            with st.container():
-                col1, col2, col3 = st.columns([3, 6, 2])
-                
-                with col1:
-                    if doc["file_type"] == "pdf":
-                        st.write("📄 PDF")
-                    elif doc["file_type"] == "docx":
-                        st.write("📝 DOCX")
-                    elif doc["file_type"] in ["txt", "md"]:
-                        st.write("📃 TXT/MD")
+        st.dataframe(
+            {
+                "Tipo": rows["labels"],
+                "Título": rows["titles"],
+                "Descrição": rows["descriptions"],
+                "Adicionado em": rows["dates"],
+            },
+            use_container_width=True,
+            hide_index=True
+        )
+        
+        # Ações sobre o documento selecionado
+        selected = st.selectbox("Documento:", range(len(rows["ids"])), format_func=lambda idx: rows["titles"][idx])
+        doc_id = rows["ids"][selected]
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("🔄 Reprocessar documento", use_container_width=True):
+                with st.spinner("Reprocessando documento..."):
+                    success, message = doc_processor.reprocess_document(doc_id)
+                    if success:
+                        invalidate_document_caches()
+                        st.success(message)
+                        st.rerun()
                     else:
-                        st.write("📁 Arquivo")
-                
-                with col2:
-                    st.write(f"**{doc['title']}**")
-                    st.caption(f"{doc.get('description', '')[:100]}...")
-                    st.caption(f"Adicionado em: {doc.get('added_date', '').split('T')[0]}")
-                
-                with col3:
-                    col3a, col3b = st.columns(2)
-                    with col3a:
-                        if st.button("🔄", key=f"reprocess_{idx}", help="Reprocessar documento"):
-                            with st.spinner("Reprocessando documento..."):
-                                success, message = doc_processor.reprocess_document(doc["id"])
-                                if success:
-                                    st.success(message)
-                                    st.experimental_rerun()
-                                else:
-                                    st.error(message)
-                    with col3b:
-                        if st.button("🗑️", key=f"delete_{idx}", help="Remover documento"):
-                            if doc_processor.remove_document(doc["id"]):
-                                st.success("Documento removido com sucesso!")
-                                st.experimental_rerun()
-                            else:
-                                st.error("Erro ao remover documento.")
-                
-                st.divider()
+                        st.error(message)
+        with col2:
+            if st.button("🗑️ Remover documento", use_container_width=True):
+                if doc_processor.remove_document(doc_id):
+                    invalidate_document_caches()
+                    st.success("Documento removido com sucesso!")
+                    st.rerun()
+                else:
+                    st.error("Erro ao remover documento.")
+
+# Comandos especiais reconhecidos no chat
+COMMAND_PATTERN = re.compile(r"!(limpar|clear|teste|reprocessar)\b")
+
+def handle_clear_command(user_input):
+    """Limpa a conversa. Retorna None para encerrar o turno."""
+    st.session_state.messages = []
+    return None
+
+def handle_test_command(user_input):
+    """Ativa o modo de teste e retorna a pergunta sem o comando."""
+    st.session_state.messages.append({"role": "system", "content": TEST_MODE_PROMPT})
+    return COMMAND_PATTERN.sub("", user_input, count=1).strip()
+
+def handle_reprocess_command(user_input):
+    """Inicia o reprocessamento de todos os documentos em segundo plano. Retorna None para encerrar o turno.
+
+    O trabalho roda no executor compartilhado; o resultado é coletado por
+    check_reprocess_status nas próximas execuções do script, de modo que o
+    usuário pode continuar conversando enquanto os embeddings são gerados.
+    """
+    future = st.session_state.get("reprocess_future")
+    if future is not None and not future.done():
+        st.session_state.messages.append({"role": "assistant", "content": "⏳ Já existe um reprocessamento em andamento. Aguarde a conclusão."})
+        return None
+    
+    st.session_state.reprocess_future = get_executor().submit(reprocess_all_documents)
+    st.session_state.reprocess_started = time.monotonic()
+    notice = "Iniciando reprocessamento de todos os documentos com geração de embeddings. Você pode continuar conversando enquanto isso."
+    st.session_state.messages.append({"role": "assistant", "content": notice})
+    with st.chat_message("assistant"):
+        st.write(notice)
+    return None
+
+def check_reprocess_status():
+    """Mostra o andamento do reprocessamento em segundo plano e registra o resultado quando terminar."""
+    future = st.session_state.get("reprocess_future")
+    if future is None:
+        return
+    
+    if not future.done():
+        elapsed = int(time.monotonic() - st.session_state.get("reprocess_started", time.monotonic()))
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.info(f"⏳ Reprocessando documentos em segundo plano... ({elapsed}s)")
+        with col2:
+            # Qualquer interação reexecuta o script e atualiza o status
+            st.button("🔄 Atualizar", key="refresh_reprocess_status", use_container_width=True)
+        return
+    
+    try:
+        success, message = future.result()
+    except Exception as e:
+        success, message = False, str(e)
+    
+    del st.session_state.reprocess_future
+    invalidate_document_caches()
+    
+    if success:
+        st.session_state.messages.append({"role": "assistant", "content": f"✅ Documentos reprocessados com sucesso! {message}"})
+    else:
+        st.session_state.messages.append({"role": "assistant", "content": f"❌ Erro ao reprocessar documentos: {message}"})
+
+COMMAND_HANDLERS = {
+    "limpar": handle_clear_command,
+    "clear": handle_clear_command,
+    "teste": handle_test_command,
+    "reprocessar": handle_reprocess_command,
+}
+
+# Orçamento de tokens do histórico enviado ao modelo
+HISTORY_TOKEN_BUDGET = 3000
+
+@st.cache_resource
+def get_token_encoder():
+    """Retorna o tokenizador do modelo de chat, ou None se o tiktoken não estiver disponível ou falhar ao carregar."""
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        return tiktoken.encoding_for_model("gpt-4")
+    except Exception as e:
+        # Ex.: arquivo BPE ausente e sem acesso à rede para baixá-lo
+        print(f"Tokenizador indisponível, usando estimativa por caracteres: {e}")
+        return None
+
+@lru_cache(maxsize=1024)
+def count_tokens(text):
+    """Conta os tokens de um texto (estimativa de 4 caracteres por token sem o tiktoken)."""
+    encoder = get_token_encoder()
+    if encoder is None:
+        return len(text) // 4 + 1
+    return len(encoder.encode(text))
+
+def trim_history(messages, budget=HISTORY_TOKEN_BUDGET):
+    """
+    Retorna as mensagens mais recentes cuja soma de tokens cabe no orçamento.
+    
+    A mensagem mais recente é sempre mantida, mesmo que sozinha exceda o orçamento.
+    
+    Args:
+        messages: Histórico de mensagens
+        budget: Número máximo de tokens
+        
+    Returns:
+        Lista com as mensagens mantidas, em ordem cronológica
+    """
+    kept = []
+    total = 0
+    for msg in reversed(messages):
+        tokens = count_tokens(msg["content"])
+        if kept and total + tokens > budget:
+            break
+        kept.append(msg)
+        total += tokens
+    kept.reverse()
+    return kept
 
 def show_chat_interface():
     """Interface de chat com o usuário"""
+    # Coletar o resultado de um reprocessamento em segundo plano, se houver
+    check_reprocess_status()
+    
+    # Limitar o histórico de mensagens antes de renderizar, para não exibir mensagens que serão descartadas
+    # Manter apenas as mensagens mais recentes que cabem no orçamento de tokens
+    kept_messages = trim_history(st.session_state.messages)
+    if len(kept_messages) < len(st.session_state.messages):
+        st.info(f"Histórico limitado para melhor desempenho. {len(st.session_state.messages) - len(kept_messages)} mensagens antigas foram resumidas.")
+        st.session_state.messages = kept_messages
+    
     # Exibir mensagens anteriores usando o chat_message nativo do Streamlit
     for msg in st.session_state.messages:
         with st.chat_message(msg["role"], avatar="🧑" if msg["role"] == "user" else None):
             st.write(msg["content"])
     
-    # Limitar o histórico de mensagens para evitar exceder limites da API
-    # Manter apenas as últimas 6 mensagens (3 pares de user-assistant)
-    if len(st.session_state.messages) > 6:
-        st.info(f"Histórico limitado para melhor desempenho. {len(st.session_state.messages) - 6} mensagens antigas foram resumidas.")
-        st.session_state.messages = st.session_state.messages[-6:]
-    
     # Entrada do usuário
     user_input = st.chat_input("Digite sua mensagem...")
     
@@ -284,77 +598,45 @@ def show_chat_interface():
         with st.chat_message("user", avatar="🧑"):
             st.write(user_input)
         
-        # Comandos especiais
-        if "!limpar" in user_input or "!clear" in user_input:
-            st.session_state.messages = []
-            return
-        
-        # Modo de teste
-        testing_mode = False
-        if "!teste" in user_input:
-            testing_mode = True
-            user_input = user_input.replace("!teste", "").strip()
-            st.session_state.messages.append({"role": "system", "content": TEST_MODE_PROMPT})
-        
-        # Comando para reprocessar documentos com embeddings
-        if "!reprocessar" in user_input:
-            st.session_state.messages.append({"role": "assistant", "content": "Iniciando reprocessamento de todos os documentos com geração de embeddings. Isso pode levar alguns minutos..."})
-            
-            try:
-                success, message = rebuild_document_index()
-                
-                if success:
-                    st.session_state.messages.append({"role": "assistant", "content": "✅ Documentos reprocessados com sucesso! Os embeddings foram gerados para todos os chunks."})
-                else:
-                    st.session_state.messages.append({"role": "assistant", "content": f"❌ Erro ao reprocessar documentos: {message}"})
-                
-                st.experimental_rerun()
-                return
-            except Exception as e:
-                st.session_state.messages.append({"role": "assistant", "content": f"❌ Erro ao reprocessar documentos: {str(e)}"})
-                st.experimental_rerun()
+        # Comandos especiais (mensagens sem "!" nem passam pela regex)
+        match = COMMAND_PATTERN.search(user_input) if "!" in user_input else None
+        if match:
+            user_input = COMMAND_HANDLERS[match.group(1)](user_input)
+            if user_input is None:
                 return
         
         # Preparar as mensagens para o modelo
-        with st.spinner("Consultando banco de dados..."):
-            try:
+        try:
+            with st.spinner("Consultando banco de dados..."):
                 # Buscar conhecimento relevante dos documentos
-                relevant_knowledge = get_relevant_knowledge(user_input)
-                
-                # Preparar mensagens para a API
-                api_messages = []
-                
-                # Obtém apenas as últimas 4 mensagens do histórico para reduzir o tamanho da solicitação
-                recent_messages = st.session_state.messages[-4:] if len(st.session_state.messages) > 4 else st.session_state.messages
-                
-                for msg in recent_messages:
-                    api_messages.append({
-                        "role": msg["role"],
-                        "content": msg["content"]
-                    })
-                
-                # Prepara o sistema com as instruções sobre como responder
-                system_content = SYSTEM_PROMPT
-                
-                # Adiciona o conhecimento relevante
-                system_content += relevant_knowledge
-                
-                api_messages.insert(0, {"role": "system", "content": system_content})
-                
-                # Obter resposta
-                response = get_completion(api_messages, model="gpt-4")
-                
-                # Adicionar resposta ao histórico
-                st.session_state.messages.append({"role": "assistant", "content": response})
+                relevant_knowledge = cached_relevant_knowledge(user_input.strip().lower(), get_index_mtime())
                 
-                # Exibir resposta
-                with st.chat_message("assistant"):
-                    st.write(response)
+                # Prepara o sistema com as instruções sobre como responder e o conhecimento relevante,
+                # seguido apenas das mensagens recentes que cabem no orçamento de tokens
+                api_messages = [{"role": "system", "content": compose_system_message(relevant_knowledge)}] + [
+                    {"role": msg["role"], "content": msg["content"]}
+                    for msg in trim_history(st.session_state.messages)
+                ]
             
-            except Exception as e:
-                st.error(f"Erro ao processar sua solicitação: {str(e)}")
-                import traceback
-                st.error(traceback.format_exc())
+            # Obter e exibir a resposta à medida que é gerada
+            with st.chat_message("assistant"):
+                response = write_stream(get_completion(api_messages, model="gpt-4"))
+            
+            # Adicionar resposta ao histórico
+            st.session_state.messages.append({"role": "assistant", "content": response})
+        
+        except Exception as e:
+            st.error(f"Erro ao processar sua solicitação: {str(e)}")
+            st.error(traceback.format_exc())
+
+@st.cache_data
+def get_system_info():
+    """Retorna informações do sistema, que não mudam durante a vida do processo."""
+    return {
+        "Sistema Operacional": f"{platform.system()} {platform.release()}",
+        "Versão do Python": platform.python_version(),
+        "Diretório de Trabalho": os.getcwd()
+    }
 
 def show_debug_interface():
     """Interface para depuração e diagnóstico"""
@@ -368,45 +650,29 @@ def show_debug_interface():
         st.subheader("Informações do Sistema")
         
         # Sistema e Python
-        import platform
-        import sys
-        import os  # Reimportar o módulo os localmente para garantir acesso
-        
-        system_info = {
-            "Sistema Operacional": f"{platform.system()} {platform.release()}",
-            "Versão do Python": platform.python_version(),
-            "Diretório de Trabalho": os.getcwd()
-        }
-        
-        for k, v in system_info.items():
+        for k, v in get_system_info().items():
             st.write(f"**{k}:** {v}")
             
         # Verificar dependências instaladas
         st.subheader("Dependências")
         
-        # Lista de dependências críticas
+        # Lista de dependências críticas (nome da distribuição instalada)
         dependencies = [
-            {"name": "Python", "test": "import sys; print(sys.version)"},
-            {"name": "OpenAI", "module": "openai", "test": "from openai import OpenAI; print('OpenAI instalado')"},
-            {"name": "Streamlit", "module": "streamlit", "test": "import streamlit; print(streamlit.__version__)"},
-            {"name": "PyMuPDF", "module": "fitz", "test": "import fitz; print(fitz.__version__)"},
-            {"name": "python-docx", "module": "docx", "test": "import docx; print(docx.__version__)"},
-            {"name": "LangChain", "module": "langchain", "test": "import langchain; print(langchain.__version__)"}
+            {"name": "OpenAI", "dist": "openai"},
+            {"name": "Streamlit", "dist": "streamlit"},
+            {"name": "PyMuPDF", "dist": "PyMuPDF"},
+            {"name": "python-docx", "dist": "python-docx"},
+            {"name": "LangChain", "dist": "langchain"}
         ]
         
+        st.success(f"✅ Python - Versão: {platform.python_version()}")
+        
         for dep in dependencies:
+            # Ler a versão dos metadados instalados, sem importar o pacote
             try:
-                # Executar o teste para obter a versão
-                import os
-                result = os.popen(f"python -c \"{dep['test']}\"").read().strip()
-                st.success(f"✅ {dep['name']} - Versão: {result}")
-            except Exception:
-                try:
-                    # Tentar apenas importar o módulo se o teste falhar
-                    __import__(dep["module"])
-                    st.success(f"✅ {dep['name']} - Instalado (versão desconhecida)")
-                except ImportError:
-                    st.error(f"❌ {dep['name']} - Não instalado")
+                st.success(f"✅ {dep['name']} - Versão: {version(dep['dist'])}")
+            except PackageNotFoundError:
+                st.error(f"❌ {dep['name']} - Não instalado")
         
         # Verificar estrutura de diretórios
         st.subheader("Estrutura de Diretórios")
@@ -425,10 +691,15 @@ def show_debug_interface():
         with col1:
             st.write("**Diretórios:**")
             for dir_info in directories:
-                exists = os.path.exists(dir_info["path"])
-                if exists:
-                    items = os.listdir(dir_info["path"])
-                    st.success(f"✅ {dir_info['name']} - {len(items)} itens")
+                # Uma única leitura do diretório, sem verificar a existência antes
+                try:
+                    with os.scandir(dir_info["path"]) as it:
+                        item_count = sum(1 for _ in it)
+                except FileNotFoundError:
+                    item_count = None
+                
+                if item_count is not None:
+                    st.success(f"✅ {dir_info['name']} - {item_count} itens")
                 elif dir_info["required"]:
                     st.error(f"❌ {dir_info['name']} - Não encontrado")
                 else:
@@ -442,7 +713,7 @@ def show_debug_interface():
                     try:
                         size = os.path.getsize(file_info["path"])
                         st.success(f"✅ {file_info['name']} - {size} bytes")
-                    except:
+                    except OSError:
                         st.success(f"✅ {file_info['name']} - Existe")
                 elif file_info["required"]:
                     st.error(f"❌ {file_info['name']} - Não encontrado")
@@ -458,11 +729,17 @@ def show_debug_interface():
             with st.spinner("Executando diagnóstico..."):
                 st.write("**Resultados do diagnóstico:**")
                 
-                # 1. Verificar diretórios
+                # 1. Verificar diretórios (uma única leitura por diretório,
+                # reaproveitada na verificação de consistência abaixo)
                 diag_results = []
+                dir_entries = {}
                 
                 for dir_info in directories:
-                    if not os.path.exists(dir_info["path"]):
+                    try:
+                        with os.scandir(dir_info["path"]) as it:
+                            dir_entries[dir_info["path"]] = {entry.name for entry in it}
+                    except FileNotFoundError:
+                        dir_entries[dir_info["path"]] = set()
                         diag_results.append({
                             "status": "error",
                             "message": f"Diretório {dir_info['name']} não existe",
@@ -475,7 +752,7 @@ def show_debug_interface():
                                     "status": "success", 
                                     "message": f"Diretório {dir_info['name']} criado automaticamente"
                                 })
-                            except:
+                            except OSError:
                                 diag_results.append({
                                     "status": "error",
                                     "message": f"Falha ao criar diretório {dir_info['name']}"
@@ -496,21 +773,20 @@ def show_debug_interface():
                             "status": "success",
                             "message": "Novo arquivo de índice criado"
                         })
-                    except:
+                    except OSError:
                         diag_results.append({
                             "status": "error",
                             "message": "Falha ao criar arquivo de índice"
                         })
                 else:
                     # Verificar se o arquivo de índice é um JSON válido
-                    try:
-                        with open("document_index.json", 'r', encoding='utf-8') as f:
-                            index = json.load(f)
+                    index_count = json_entry_count("document_index.json", os.path.getmtime("document_index.json"))
+                    if index_count is not None:
                         diag_results.append({
                             "status": "success",
-                            "message": f"Arquivo de índice é válido: {len(index)} documentos"
+                            "message": f"Arquivo de índice é válido: {index_count} documentos"
                         })
-                    except:
+                    else:
                         diag_results.append({
                             "status": "error",
                             "message": "Arquivo de índice é inválido",
@@ -519,13 +795,13 @@ def show_debug_interface():
                 
                 # 3. Verificar consistência entre índice e arquivos
                 try:
-                    doc_processor = get_document_processor()
-                    doc_list = doc_processor.get_document_list()
+                    doc_list = cached_document_list(get_index_mtime())
+                    doc_files = dir_entries["documents"]
+                    chunk_files = dir_entries["document_chunks"]
                     
                     for doc in doc_list:
                         # Verificar se o arquivo do documento existe
-                        doc_file = os.path.join("documents", doc.get("filename", ""))
-                        if not os.path.exists(doc_file):
+                        if doc.get("filename", "") not in doc_files:
                             diag_results.append({
                                 "status": "warning",
                                 "message": f"Arquivo do documento '{doc.get('title')}' não encontrado",
@@ -533,8 +809,7 @@ def show_debug_interface():
                             })
                         
                         # Verificar se o arquivo de chunks existe
-                        chunks_file = os.path.join("document_chunks", f"{doc.get('id')}.json")
-                        if not os.path.exists(chunks_file):
+                        if f"{doc.get('id')}.json" not in chunk_files:
                             diag_results.append({
                                 "status": "warning",
                                 "message": f"Arquivo de chunks para '{doc.get('title')}' não encontrado",
@@ -589,37 +864,28 @@ def show_debug_interface():
                 if st.button("Testar Extração de Texto", use_container_width=True):
                     with st.spinner("Processando PDF..."):
                         try:
-                            # Salvar o arquivo temporariamente
-                            temp_path = os.path.join("documents", "debug_" + pdf_file.name)
-                            with open(temp_path, "wb") as f:
-                                f.write(pdf_file.getbuffer())
-                            
-                            # Tentar abrir o PDF
-                            st.info(f"Tentando abrir o PDF: {temp_path}")
-                            
-                            doc = fitz.open(temp_path)
-                            st.success(f"PDF aberto com sucesso! Páginas: {len(doc)}")
-                            
-                            # Extrair texto
-                            total_text = ""
+                            # Abrir o PDF diretamente da memória, sem gravar em disco
+                            st.info(f"Tentando abrir o PDF: {pdf_file.name}")
                             
-                            for i, page in enumerate(doc):
-                                page_text = page.get_text()
-                                total_text += page_text
-                                st.write(f"Página {i+1}: {len(page_text)} caracteres")
+                            with fitz.open(stream=pdf_file.getvalue(), filetype="pdf") as doc:
+                                st.success(f"PDF aberto com sucesso! Páginas: {len(doc)}")
+                                
+                                # Extrair texto
+                                pages = []
+                                
+                                for i, page in enumerate(doc):
+                                    page_text = page.get_text()
+                                    pages.append(page_text)
+                                    st.write(f"Página {i+1}: {len(page_text)} caracteres")
+                                
+                                total_text = "".join(pages)
                             
                             # Mostrar uma amostra do texto extraído
                             st.subheader("Amostra do texto extraído:")
                             st.info(total_text[:500] + "..." if len(total_text) > 500 else total_text)
                             
-                            # Limpar
-                            doc.close()
-                            if os.path.exists(temp_path):
-                                os.remove(temp_path)
-                            
                         except Exception as e:
                             st.error(f"Erro ao processar o PDF: {str(e)}")
-                            import traceback
                             st.code(traceback.format_exc())
     
     # Tab de Gestão de Documentos
@@ -628,38 +894,39 @@ def show_debug_interface():
         
         # Listar documentos no diretório
         if os.path.exists("documents"):
-            docs = os.listdir("documents")
+            with os.scandir("documents") as it:
+                docs = [(entry.name, entry.stat().st_size) for entry in it if entry.is_file(follow_symlinks=False)]
             
             st.write(f"**Arquivos no diretório de documentos:** {len(docs)}")
             
             if not docs:
                 st.info("Nenhum arquivo encontrado")
             else:
-                for doc in docs:
-                    doc_path = os.path.join("documents", doc)
-                    doc_size = os.path.getsize(doc_path)
+                for doc, doc_size in docs:
                     st.write(f"📄 **{doc}** - {doc_size} bytes")
         
         # Listar chunks
         if os.path.exists("document_chunks"):
-            chunks = os.listdir("document_chunks")
+            with os.scandir("document_chunks") as it:
+                chunks = [(entry.name, entry.path, entry.stat()) for entry in it if entry.is_file(follow_symlinks=False)]
             
             st.write(f"**Arquivos no diretório de chunks:** {len(chunks)}")
             
             if not chunks:
                 st.info("Nenhum arquivo de chunks encontrado")
             else:
-                for chunk in chunks:
-                    chunk_path = os.path.join("document_chunks", chunk)
-                    chunk_size = os.path.getsize(chunk_path)
-                    
-                    # Verificar se é um arquivo JSON válido
-                    try:
-                        with open(chunk_path, 'r', encoding='utf-8') as f:
-                            chunk_data = json.load(f)
-                            st.write(f"📄 **{chunk}** - {chunk_size} bytes ({len(chunk_data)} chunks)")
-                    except:
-                        st.write(f"📄 **{chunk}** - {chunk_size} bytes (arquivo inválido)")
+                # Usar a contagem de chunks registrada no índice; só analisar arquivos fora do índice
+                indexed_counts = {doc["id"]: doc.get("num_chunks") for doc in cached_document_list(get_index_mtime())}
+                
+                for chunk, chunk_path, chunk_stat in chunks:
+                    chunk_count = indexed_counts.get(os.path.splitext(chunk)[0])
+                    if chunk_count is None:
+                        # Verificar se é um arquivo JSON válido
+                        chunk_count = json_entry_count(chunk_path, chunk_stat.st_mtime)
+                    if chunk_count is not None:
+                        st.write(f"📄 **{chunk}** - {chunk_stat.st_size} bytes ({chunk_count} chunks)")
+                    else:
+                        st.write(f"📄 **{chunk}** - {chunk_stat.st_size} bytes (arquivo inválido)")
         
         # Ações de manutenção
         st.subheader("Ações de Manutenção")
@@ -671,8 +938,9 @@ def show_debug_interface():
                 with st.spinner("Reconstruindo índice..."):
                     try:
                         if rebuild_document_index():
+                            invalidate_document_caches()
                             st.success("Índice reconstruído com sucesso!")
-                            st.experimental_rerun()
+                            st.rerun()
                         else:
                             st.error("Falha ao reconstruir índice")
                     except Exception as e:
@@ -683,30 +951,28 @@ def show_debug_interface():
                 if st.checkbox("Confirmar limpeza de todos os dados?"):
                     with st.spinner("Limpando dados..."):
                         try:
+                            # Fechar o cache de embeddings de consultas antes de apagar os arquivos
+                            _close_query_cache()
+                            
                             # Limpar índice
-                            with open("document_index.json", 'w', encoding='utf-8') as f:
+                            with open(INDEX_FILE, 'w', encoding='utf-8') as f:
                                 json.dump({}, f)
                                 
-                            # Limpar diretórios
-                            import shutil
-                            for file in os.listdir("documents"):
-                                file_path = os.path.join("documents", file)
-                                try:
-                                    if os.path.isfile(file_path):
-                                        os.remove(file_path)
-                                except:
-                                    pass
-                                    
-                            for file in os.listdir("document_chunks"):
-                                file_path = os.path.join("document_chunks", file)
-                                try:
-                                    if os.path.isfile(file_path):
-                                        os.remove(file_path)
-                                except:
-                                    pass
+                            # Limpar diretórios removendo e recriando cada um
+                            for directory in (DOCUMENTS_DIR, CHUNKS_DIR):
+                                shutil.rmtree(directory, ignore_errors=True)
+                                os.makedirs(directory, exist_ok=True)
+                            
+                            # Remover a matriz de busca da coleção e o cache de embeddings de consultas
+                            # (o shelve pode gravar vários arquivos com sufixos diferentes)
+                            query_cache_files = glob.glob(QUERY_EMBEDDINGS_CACHE + "*")
+                            for corpus_file in (CORPUS_EMBEDDINGS_FILE, CORPUS_REFS_FILE, *query_cache_files):
+                                if os.path.exists(corpus_file):
+                                    os.remove(corpus_file)
                                     
+                            invalidate_document_caches()
                             st.success("Sistema limpo com sucesso!")
-                            st.experimental_rerun()
+                            st.rerun()
                         except Exception as e:
                             st.error(f"Erro ao limpar sistema: {str(e)}")
 
@@ -717,7 +983,6 @@ if __name__ == "__main__":
         print("Aplicação iniciada com sucesso!")
     except Exception as e:
         print(f"ERRO AO INICIAR: {str(e)}")
-        import traceback
         traceback.print_exc()
         
         # Mostrar erro no Streamlit também
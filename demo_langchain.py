@@ -6,24 +6,112 @@ e busca semântica, similarmente ao que a aplicação Saori faz.
 """
 import os
 import json
+import asyncio
+import hashlib
+import importlib.util
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+import numpy as np
 from dotenv import load_dotenv
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
-# Verificar disponibilidade do LangChain
-try:
-    from langchain.text_splitter import RecursiveCharacterTextSplitter
-    from langchain_openai import OpenAIEmbeddings
-    from langchain_community.vectorstores import FAISS
-    from langchain_core.documents import Document
-    LANGCHAIN_AVAILABLE = True
+# Verificar disponibilidade do LangChain sem importá-lo; os módulos pesados
+# são importados dentro de cada demonstração, apenas quando usados
+LANGCHAIN_AVAILABLE = all(
+    importlib.util.find_spec(module) is not None
+    for module in ("langchain", "langchain_openai", "langchain_community")
+)
+if LANGCHAIN_AVAILABLE:
     print("[OK] LangChain está disponível")
-except ImportError:
-    LANGCHAIN_AVAILABLE = False
+else:
     print("[ERRO] LangChain não está disponível")
     exit(1)
 
+# Diretório do cache de embeddings (vetores indexados pelo hash do texto)
+EMBEDDING_CACHE_DIR = "./emb_cache"
+
+# Backend de embeddings: "openai" (padrão) ou "local" (sentence-transformers)
+EMBEDDINGS_BACKEND = os.getenv("EMBEDDINGS_BACKEND", "openai").lower()
+LOCAL_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Diretório dos vectorstores FAISS salvos, um subdiretório por conjunto de chunks
+FAISS_CACHE_DIR = "./faiss_cache"
+
+# A partir desta quantidade de vetores a busca usa um índice HNSW (aproximado)
+HNSW_MIN_VECTORS = 10000
+
+# A partir desta quantidade de vetores eles são reduzidos por PCA antes de indexar
+PCA_MIN_VECTORS = 5000
+PCA_DIM = 256
+
+# A partir desta quantidade de vetores eles são armazenados quantizados em int8
+SQ8_MIN_VECTORS = 2000
+
+class PrefixSumMergeMixin:
+    """
+    Etapa de junção otimizada para os text splitters do LangChain.
+    
+    O tamanho de cada pedaço é calculado uma única vez e acumulado em somas
+    prefixadas; o fim de cada chunk e o início do próximo (sobreposição) são
+    encontrados por busca binária, com O(log n) comparações por chunk.
+    Os pedaços recebidos são não vazios, como os produzidos pelo splitter recursivo.
+    """
+    
+    def _merge_splits(self, splits, separator):
+        splits = list(splits)
+        if not splits:
+            return []
+        
+        separator_len = self._length_function(separator)
+        
+        # offsets[i] = tamanho dos i primeiros pedaços, cada um seguido do separador.
+        # Tamanho da janela [a, b) = offsets[b] - offsets[a] - separator_len
+        offsets = [0]
+        for piece in splits:
+            offsets.append(offsets[-1] + self._length_function(piece) + separator_len)
+        
+        docs = []
+        start = 0
+        while True:
+            # Maior janela que cabe em chunk_size (ao menos um pedaço)
+            end = bisect_right(offsets, offsets[start] + separator_len + self._chunk_size, start + 1) - 1
+            end = max(end, start + 1)
+            
+            doc = self._join_docs(splits[start:end], separator)
+            if doc is not None:
+                docs.append(doc)
+            if end >= len(splits):
+                break
+            
+            # Próximo início: primeira posição em que a sobreposição cabe em chunk_overlap
+            # e ainda há espaço para o próximo pedaço
+            start = bisect_left(
+                offsets,
+                max(offsets[end] - separator_len - self._chunk_overlap,
+                    offsets[end + 1] - separator_len - self._chunk_size),
+                start + 1,
+                end
+            )
+        
+        return docs
+
+@lru_cache(maxsize=1)
+def fast_text_splitter_class():
+    """Retorna o RecursiveCharacterTextSplitter com a junção otimizada (importa o LangChain na primeira chamada)."""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    return type("FastRecursiveCharacterTextSplitter", (PrefixSumMergeMixin, RecursiveCharacterTextSplitter), {})
+
+@lru_cache(maxsize=1)
+def get_text_splitter():
+    """Retorna o text splitter da demonstração, criado uma única vez e reutilizado."""
+    return fast_text_splitter_class()(
+        chunk_size=200,
+        chunk_overlap=50,
+        separators=["\n## ", "\n### ", "\n#### ", "\n", " ", ""]
+    )
+
 def texto_exemplo():
     """Retorna um texto de exemplo para demonstrar a divisão de texto."""
     return """
@@ -58,45 +146,259 @@ def demo_text_splitting():
     print("\n=== Demonstração de Divisão de Texto ===")
     texto = texto_exemplo()
     
-    # Criar o text splitter
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=200,
-        chunk_overlap=50,
-        separators=["\n## ", "\n### ", "\n#### ", "\n", " ", ""]
-    )
-    
     # Dividir o texto
-    chunks = text_splitter.split_text(texto)
-    
-    print(f"Texto original: {len(texto)} caracteres")
-    print(f"Dividido em {len(chunks)} chunks")
-    print("\nPrimeiros 3 chunks:")
+    chunks = get_text_splitter().split_text(texto)
     
+    # Montar o relatório inteiro e escrevê-lo com um único print
+    separator = "-" * 50
+    lines = [
+        f"Texto original: {len(texto)} caracteres",
+        f"Dividido em {len(chunks)} chunks",
+        "\nPrimeiros 3 chunks:"
+    ]
     for i, chunk in enumerate(chunks[:3]):
-        print(f"\nChunk {i+1} ({len(chunk)} caracteres):")
-        print("-" * 50)
-        print(chunk)
-        print("-" * 50)
+        lines.append(f"\nChunk {i+1} ({len(chunk)} caracteres):\n{separator}\n{chunk}\n{separator}")
+    print("\n".join(lines))
     
     return chunks
 
+def normalize_whitespace(text):
+    """Colapsa sequências de espaços em branco, para que variações de formatação gerem a mesma chave de deduplicação."""
+    return " ".join(text.split())
+
+async def embed_in_batches(embeddings, texts, batch_size=1000, max_concurrency=5):
+    """
+    Gera embeddings enviando vários lotes em paralelo.
+    
+    Args:
+        embeddings: Modelo de embeddings do LangChain
+        texts: Lista de textos
+        batch_size: Quantidade de textos por lote
+        max_concurrency: Número máximo de lotes em andamento ao mesmo tempo
+        
+    Returns:
+        list: Vetores na mesma ordem dos textos
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    async def embed_batch(batch):
+        async with semaphore:
+            # Chamada síncrona em uma thread: funciona também com embeddings em cache,
+            # que não implementam a versão assíncrona
+            return await asyncio.to_thread(embeddings.embed_documents, batch)
+    
+    # Textos que diferem apenas em espaços e quebras de linha são enviados uma única vez:
+    # a forma normalizada é só a chave; o texto embedado é o primeiro original de cada chave
+    keys = [normalize_whitespace(text) for text in texts]
+    text_by_key = {}
+    for key, text in zip(keys, texts):
+        text_by_key.setdefault(key, text)
+    unique_keys = list(text_by_key)
+    
+    # Agrupar textos de tamanho parecido no mesmo lote reduz o padding no servidor
+    unique_keys.sort(key=lambda key: len(text_by_key[key]), reverse=True)
+    
+    batches = [
+        [text_by_key[key] for key in unique_keys[i:i + batch_size]]
+        for i in range(0, len(unique_keys), batch_size)
+    ]
+    results = await asyncio.gather(*[embed_batch(batch) for batch in batches])
+    
+    # gather preserva a ordem dos lotes; distribuir cada vetor a todos os textos com a mesma chave
+    vector_by_key = dict(zip(unique_keys, (vector for batch_vectors in results for vector in batch_vectors)))
+    return [vector_by_key[key] for key in keys]
+
+@lru_cache(maxsize=1)
+def faiss_gpu_resources():
+    """Retorna os recursos de GPU do FAISS, ou None quando não há GPU (ou com faiss-cpu)."""
+    import faiss
+    if not hasattr(faiss, "StandardGpuResources") or faiss.get_num_gpus() == 0:
+        return None
+    return faiss.StandardGpuResources()
+
+def base_index(index):
+    """Retorna o índice que guarda os vetores, sem o IndexPreTransform (PCA) por cima."""
+    import faiss
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexPreTransform):
+        index = faiss.downcast_index(index.index)
+    return index
+
+def is_gpu_index(index):
+    """Indica se os vetores do índice estão na GPU."""
+    import faiss
+    return hasattr(faiss, "GpuIndex") and isinstance(base_index(index), faiss.GpuIndex)
+
+def index_to_gpu(index):
+    """
+    Move o índice para a GPU quando disponível; caso contrário, retorna o próprio índice.
+    
+    Apenas índices exatos (IndexFlat) são movidos: o clonador de GPU do FAISS não
+    implementa o HNSW nem o IndexScalarQuantizer, que continuam na CPU.
+    """
+    import faiss
+    resources = faiss_gpu_resources()
+    if resources is None or not isinstance(base_index(index), faiss.IndexFlat):
+        return index
+    try:
+        return faiss.index_cpu_to_gpu(resources, 0, index)
+    except RuntimeError as e:
+        print(f"[AVISO] Índice mantido na CPU: {e}")
+        return index
+
+def save_vectorstore(db, path):
+    """Salva o vectorstore em disco (índices na GPU são copiados para a CPU antes)."""
+    import faiss
+    if not is_gpu_index(db.index):
+        db.save_local(path)
+        return
+    
+    gpu_index = db.index
+    db.index = faiss.index_gpu_to_cpu(gpu_index)
+    try:
+        db.save_local(path)
+    finally:
+        db.index = gpu_index
+
+def build_vectorstore(embeddings, texts, metadatas, vectors):
+    """
+    Cria o vectorstore FAISS com produto interno sobre vetores normalizados.
+    
+    Com vetores de norma 1 o produto interno é a similaridade de cosseno, e o
+    IndexFlatIP evita a subtração por dimensão do IndexFlatL2 padrão. Para
+    coleções maiores os vetores são quantizados em int8, reduzidos por PCA e
+    indexados em HNSW, conforme a quantidade.
+    
+    Args:
+        embeddings: Modelo de embeddings usado nas consultas
+        texts: Lista de textos, na mesma ordem dos vetores
+        metadatas: Metadados de cada texto
+        vectors: Embeddings dos documentos
+        
+    Returns:
+        FAISS: Vectorstore pronto para busca
+    """
+    import faiss
+    from langchain_core.documents import Document
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+    from langchain_community.vectorstores.utils import DistanceStrategy
+    
+    matrix = np.asarray(vectors, dtype=np.float32)
+    faiss.normalize_L2(matrix)
+    
+    dim = matrix.shape[1]
+    # Reduzir a dimensão quando há vetores suficientes para treinar o PCA
+    use_pca = len(matrix) >= PCA_MIN_VECTORS and dim > PCA_DIM
+    index_dim = PCA_DIM if use_pca else dim
+    # Quantização escalar int8: 1/4 da memória, consultas continuam em float32
+    use_sq8 = len(matrix) >= SQ8_MIN_VECTORS
+    
+    if len(matrix) >= HNSW_MIN_VECTORS:
+        # Grafo HNSW: busca sub-linear com recall próximo do exato
+        if use_sq8:
+            index = faiss.IndexHNSWSQ(index_dim, faiss.ScalarQuantizer.QT_8bit, 32, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexHNSWFlat(index_dim, 32, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = 200
+        index.hnsw.efSearch = 64
+    elif use_sq8:
+        index = faiss.IndexScalarQuantizer(index_dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    else:
+        # Poucos vetores: busca exata é mais rápida que percorrer o grafo
+        index = faiss.IndexFlatIP(index_dim)
+    
+    if use_pca:
+        # O IndexPreTransform aplica a mesma projeção aos vetores das consultas
+        index = faiss.IndexPreTransform(faiss.PCAMatrix(dim, PCA_DIM), index)
+    
+    # Índices exatos rodam na GPU; HNSW e SQ8 ficam na CPU
+    index = index_to_gpu(index)
+    
+    # PCA e quantizador precisam ser treinados com os próprios vetores
+    if not index.is_trained:
+        index.train(matrix)
+    index.add(matrix)
+    
+    doc_ids = [str(i) for i in range(len(texts))]
+    docstore = InMemoryDocstore({
+        doc_id: Document(page_content=text, metadata=metadata)
+        for doc_id, text, metadata in zip(doc_ids, texts, metadatas)
+    })
+    return FAISS(
+        embeddings,
+        index,
+        docstore,
+        dict(enumerate(doc_ids)),
+        normalize_L2=True,
+        distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+    )
+
+def create_base_embeddings(api_key):
+    """
+    Cria o modelo de embeddings conforme EMBEDDINGS_BACKEND.
+    
+    Args:
+        api_key: Chave da API OpenAI (ignorada no backend local)
+        
+    Returns:
+        tuple: (modelo de embeddings, nome do modelo)
+    """
+    if EMBEDDINGS_BACKEND == "local":
+        # Modelo local: um único forward em lote, na GPU quando disponível
+        import torch
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        embeddings = HuggingFaceEmbeddings(
+            model_name=LOCAL_EMBEDDING_MODEL,
+            model_kwargs={"device": device},
+            encode_kwargs={"batch_size": 64, "normalize_embeddings": True}
+        )
+        print(f"Usando modelo local {LOCAL_EMBEDDING_MODEL} ({device})")
+        return embeddings, LOCAL_EMBEDDING_MODEL
+    
+    from langchain_openai import OpenAIEmbeddings
+    # chunk_size define quantos textos vão em cada requisição de embeddings
+    embeddings = OpenAIEmbeddings(openai_api_key=api_key, chunk_size=1000)
+    return embeddings, embeddings.model
+
+def vectorstore_cache_path(chunks, model):
+    """
+    Retorna o diretório do vectorstore salvo para estes chunks.
+    
+    Args:
+        chunks: Lista de textos indexados
+        model: Nome do modelo de embeddings
+        
+    Returns:
+        str: Caminho do diretório, identificado pelo hash SHA-256 do conteúdo
+    """
+    digest = hashlib.sha256()
+    digest.update(model.encode("utf-8"))
+    for chunk in chunks:
+        digest.update(b"\0")
+        digest.update(chunk.encode("utf-8"))
+    return os.path.join(FAISS_CACHE_DIR, digest.hexdigest())
+
 def demo_embeddings_and_search(chunks):
     """Demonstra como criar embeddings e realizar busca semântica."""
     print("\n=== Demonstração de Embeddings e Busca Semântica ===")
     
-    # Verificar API key
+    # Verificar API key (desnecessária com o modelo local)
     api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
+    if not api_key and EMBEDDINGS_BACKEND != "local":
         print("[ERRO] OPENAI_API_KEY não encontrada. Definindo uma chave fictícia para exemplo.")
         print("Para executar esse exemplo corretamente, defina a chave da API no arquivo .env")
         print("Este exemplo seguirá apenas com demonstração do código, sem fazer chamadas reais à API")
         return
     
-    # Criar documentos
-    documents = [Document(page_content=chunk, metadata={"source": "demo", "chunk_id": i}) 
-                 for i, chunk in enumerate(chunks)]
+    from langchain.embeddings import CacheBackedEmbeddings
+    from langchain.storage import LocalFileStore
     
-    print(f"Criados {len(documents)} objetos Document")
+    # Metadados de cada chunk; os objetos Document só são criados ao montar o docstore
+    metadatas = [{"source": "demo", "chunk_id": i} for i in range(len(chunks))]
+    
+    print(f"Preparados {len(chunks)} chunks para indexação")
     
     try:
         # Método alternativo de inicialização
@@ -104,13 +406,34 @@ def demo_embeddings_and_search(chunks):
         print(f"Versão do OpenAI instalada e compatível com API v1.x")
         
         # Versão mais recente da API (1.x)
-        embeddings = OpenAIEmbeddings(openai_api_key=api_key)
+        base_embeddings, model_name = create_base_embeddings(api_key)
+        
+        # Cache em disco: apenas textos ainda não vistos são enviados ao modelo
+        embeddings = CacheBackedEmbeddings.from_bytes_store(
+            base_embeddings,
+            LocalFileStore(EMBEDDING_CACHE_DIR),
+            namespace=model_name
+        )
         
         print("Modelo de embeddings inicializado")
         
-        # Criar vectorstore
-        db = FAISS.from_documents(documents, embeddings)
-        print("Vectorstore FAISS criado com sucesso")
+        cache_path = vectorstore_cache_path(chunks, model_name)
+        if os.path.isdir(cache_path):
+            # Mesmos chunks de uma execução anterior: carregar sem gerar embeddings nem reindexar
+            from langchain_community.vectorstores import FAISS
+            from langchain_community.vectorstores.utils import DistanceStrategy
+            db = FAISS.load_local(cache_path, embeddings, normalize_L2=True,
+                                  distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT)
+            db.index = index_to_gpu(db.index)
+            print("Vectorstore FAISS carregado do cache")
+        else:
+            # Gerar os embeddings em lotes enviados em paralelo
+            vectors = asyncio.run(embed_in_batches(embeddings, chunks, batch_size=1000))
+            
+            # Criar vectorstore a partir dos vetores já calculados
+            db = build_vectorstore(embeddings, chunks, metadatas, vectors)
+            save_vectorstore(db, cache_path)
+            print("Vectorstore FAISS criado com sucesso")
         
         # Realizar busca semântica
         query = "Quais são os frameworks JavaScript mais populares?"
@@ -120,7 +443,7 @@ def demo_embeddings_and_search(chunks):
         
         print("\nResultados da busca:")
         for i, (doc, score) in enumerate(similar_docs):
-            print(f"\nResultado {i+1} (similaridade: {1-score:.4f}):")
+            print(f"\nResultado {i+1} (similaridade: {score:.4f}):")
             print("-" * 50)
             print(doc.page_content)
             print("-" * 50)
@@ -1,12 +1,26 @@
 import os
 import json
+import logging
 import pickle
+import shelve
+import atexit
 import datetime
 import time
 from typing import List, Dict, Any, Optional, Tuple, Union
 import numpy as np
 import hashlib
-import traceback
+import re
+import shutil
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+# Logger do módulo; o nível é configurado pela variável de ambiente SAORI_LOG_LEVEL.
+# Mensagens abaixo do nível não chegam a ser formatadas. Os handlers ficam a cargo
+# da aplicação (veja app.py)
+log = logging.getLogger(__name__)
+log.setLevel(getattr(logging, os.getenv("SAORI_LOG_LEVEL", "INFO").upper(), logging.INFO))
 
 # Configurar a disponibilidade do LangChain
 LANGCHAIN_AVAILABLE = False
@@ -18,26 +32,33 @@ try:
     from langchain_community.document_loaders import TextLoader, PyMuPDFLoader, Docx2txtLoader
     from langchain_core.documents import Document  # Importação corrigida
     LANGCHAIN_AVAILABLE = True
-    print("LangChain disponível e será usado para processamento de documentos")
+    log.info("LangChain disponível e será usado para processamento de documentos")
 except ImportError as e:
-    print(f"LangChain não está disponível: {e}")
-    print("Usando implementação própria para processamento de documentos")
+    log.warning("LangChain não está disponível: %s", e)
+    log.info("Usando implementação própria para processamento de documentos")
     LANGCHAIN_AVAILABLE = False
 
 try:
     import fitz  # PyMuPDF
     PYMUPDF_AVAILABLE = True
 except ImportError:
-    print("PyMuPDF não está disponível. Não será possível processar PDFs.")
+    log.warning("PyMuPDF não está disponível. Não será possível processar PDFs.")
     PYMUPDF_AVAILABLE = False
 
 try:
     import docx
     DOCX_AVAILABLE = True
 except ImportError:
-    print("python-docx não está disponível. Não será possível processar arquivos DOCX.")
+    log.warning("python-docx não está disponível. Não será possível processar arquivos DOCX.")
     DOCX_AVAILABLE = False
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    log.warning("orjson não está disponível. Usando o módulo json padrão.")
+    ORJSON_AVAILABLE = False
+
 # Diretório onde os documentos serão armazenados
 DOCUMENTS_DIR = "documents"
 # Diretório onde os chunks processados serão armazenados
@@ -45,10 +66,244 @@ CHUNKS_DIR = "document_chunks"
 # Arquivo de índice para rastrear documentos
 INDEX_FILE = "document_index.json"
 
+# Matriz de embeddings de toda a coleção (int8, linhas normalizadas) e referências
+# dos chunks correspondentes, reconstruídas sempre que o índice muda
+CORPUS_EMBEDDINGS_FILE = "document_embeddings.npy"
+CORPUS_REFS_FILE = "document_embeddings.json"
+
+# Modelo de embeddings da OpenAI e cache persistente dos embeddings de consultas,
+# guardado junto do índice (fora de CHUNKS_DIR, que só deve conter chunks)
+EMBEDDING_MODEL = "text-embedding-ada-002"
+QUERY_EMBEDDINGS_CACHE = "query_embeddings_cache"
+
 # Criar diretórios necessários se não existirem
 os.makedirs(DOCUMENTS_DIR, exist_ok=True)
 os.makedirs(CHUNKS_DIR, exist_ok=True)
 
+# PDFs com pelo menos esta quantidade de páginas têm o texto extraído em paralelo
+PDF_PARALLEL_MIN_PAGES = 64
+PDF_EXTRACTION_WORKERS = 4
+
+# Tamanho máximo (em caracteres) e sobreposição dos chunks
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+
+# Separadores em ordem de preferência: parágrafo, linha, palavra.
+# O grupo de captura mantém o separador no fim de cada pedaço
+SEPARATOR_PATTERNS = [re.compile(r"(\n\n+)"), re.compile(r"(\n)"), re.compile(r"( +)")]
+
+# A partir desta quantidade de chunks, a busca pré-seleciona candidatos pela
+# assinatura SimHash antes de calcular o cosseno
+SIMHASH_MIN_CHUNKS = 20000
+SIMHASH_CANDIDATES = 2000
+SIMHASH_BITS = 64
+
+# Linhas da matriz int8 convertidas para float32 de cada vez no cálculo das similaridades
+SCORE_BLOCK_ROWS = 4096
+
+def _split_keeping_separator(pattern: "re.Pattern", text: str) -> List[str]:
+    """Divide o texto pelo padrão, mantendo cada separador junto ao pedaço anterior."""
+    parts = pattern.split(text)
+    pieces = [parts[i] + (parts[i + 1] if i + 1 < len(parts) else "") for i in range(0, len(parts), 2)]
+    return [piece for piece in pieces if piece]
+
+def _atomic_pieces(text: str, chunk_size: int, level: int = 0):
+    """Gera pedaços de até chunk_size caracteres, usando o separador mais forte possível."""
+    if len(text) <= chunk_size:
+        yield text
+    elif level == len(SEPARATOR_PATTERNS):
+        # Sem separadores restantes: cortar em posições fixas
+        for i in range(0, len(text), chunk_size):
+            yield text[i:i + chunk_size]
+    else:
+        for piece in _split_keeping_separator(SEPARATOR_PATTERNS[level], text):
+            yield from _atomic_pieces(piece, chunk_size, level + 1)
+
+def split_text_into_chunks(text: str, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """
+    Divide o texto em chunks de até chunk_size caracteres, com sobreposição.
+    
+    Os pedaços são obtidos com expressões regulares pré-compiladas (parágrafos,
+    depois linhas, depois palavras) e agrupados em uma única passada.
+    
+    Args:
+        text: Texto a ser dividido
+        chunk_size: Tamanho máximo de cada chunk
+        chunk_overlap: Quantidade aproximada de caracteres repetidos entre chunks vizinhos
+        
+    Returns:
+        Lista de textos dos chunks (sem espaços nas extremidades)
+    """
+    chunks = []
+    window = deque()
+    window_len = 0
+    
+    window_lens = deque()  # tamanho de cada pedaço da janela, calculado uma única vez
+    
+    def flush():
+        chunk_text = "".join(window).strip()
+        if chunk_text:
+            chunks.append(chunk_text)
+    
+    for piece in _atomic_pieces(text, chunk_size):
+        piece_len = len(piece)
+        if window and window_len + piece_len > chunk_size:
+            flush()
+            # Manter no início do próximo chunk apenas o final do anterior
+            while window and (window_len > chunk_overlap or window_len + piece_len > chunk_size):
+                window.popleft()
+                window_len -= window_lens.popleft()
+        window.append(piece)
+        window_lens.append(piece_len)
+        window_len += piece_len
+    
+    if window:
+        flush()
+    return chunks
+
+@lru_cache(maxsize=256)
+def _load_chunks_file(chunks_path: str, mtime_ns: int) -> List[Dict[str, Any]]:
+    """
+    Carrega um arquivo de chunks, reaproveitando o conteúdo enquanto ele não for alterado.
+    
+    A data de modificação faz parte da chave: ao salvar novos chunks o arquivo
+    é lido novamente na próxima chamada.
+    """
+    return load_json_file(chunks_path)
+
+def text_hash(text: str) -> str:
+    """Retorna um hash curto do texto de um chunk, usado para detectar trechos inalterados."""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+@lru_cache(maxsize=4096)
+def _lowercase(text: str) -> str:
+    """Retorna o texto em minúsculas, reaproveitando o resultado para textos já vistos."""
+    return text.lower()
+
+def load_json_file(file_path: str) -> Any:
+    """
+    Carrega um arquivo JSON, usando orjson quando disponível.
+    
+    Args:
+        file_path: Caminho do arquivo JSON
+        
+    Returns:
+        Conteúdo do arquivo decodificado
+    """
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def write_json_file(file_path: str, data: Any) -> None:
+    """
+    Grava dados em um arquivo JSON, usando orjson quando disponível.
+    
+    Args:
+        file_path: Caminho do arquivo JSON
+        data: Dados a serem gravados
+    """
+    # JSON compacto: os arquivos são lidos pela aplicação, não editados manualmente
+    with open(file_path, 'wb', buffering=1 << 20) as f:
+        if ORJSON_AVAILABLE:
+            f.write(orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS))
+        else:
+            f.write(json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+def index_version(documents_index: Dict[str, Any]) -> str:
+    """
+    Calcula a versão do índice de documentos a partir do seu conteúdo.
+    
+    Cada documento guarda em "chunks_hash" o hash dos seus chunks, então a versão
+    muda sempre que um documento é adicionado, removido ou reprocessado, mesmo que o
+    arquivo do índice seja regravado dentro da resolução do mtime.
+    
+    Args:
+        documents_index: Índice de documentos
+        
+    Returns:
+        Hash hexadecimal do índice
+    """
+    serialized = json.dumps(documents_index, sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(serialized.encode('utf-8'), digest_size=16).hexdigest()
+
+def quantize_embeddings(vectors: List[List[float]]) -> np.ndarray:
+    """
+    Normaliza os embeddings e os quantiza em int8 (escala implícita de 1/127).
+    
+    A busca usa similaridade de cosseno, que não depende da escala, então os
+    vetores quantizados podem ser comparados diretamente.
+    
+    Args:
+        vectors: Lista de embeddings
+        
+    Returns:
+        Matriz int8 com uma linha por embedding
+    """
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.round(matrix / norms * 127).astype(np.int8)
+
+def quantized_scores(matrix: np.ndarray, query_vector: np.ndarray) -> np.ndarray:
+    """
+    Calcula o produto da matriz int8 quantizada pelo vetor da consulta.
+    
+    As linhas são convertidas para float32 em blocos de SCORE_BLOCK_ROWS, sem
+    materializar a matriz inteira em float32, e a escala da quantização (1/127)
+    é aplicada uma única vez ao vetor de resultados.
+    
+    Args:
+        matrix: Matriz int8 de quantize_embeddings (pode ser mapeada em memória)
+        query_vector: Embedding normalizado da consulta (float32)
+        
+    Returns:
+        Vetor float32 com a similaridade de cosseno de cada linha
+    """
+    scores = np.empty(matrix.shape[0], dtype=np.float32)
+    for start in range(0, matrix.shape[0], SCORE_BLOCK_ROWS):
+        block = matrix[start:start + SCORE_BLOCK_ROWS]
+        scores[start:start + len(block)] = block.astype(np.float32) @ query_vector
+    scores *= 1.0 / 127
+    return scores
+
+@lru_cache(maxsize=8)
+def _simhash_hyperplanes(dim: int) -> np.ndarray:
+    """Hiperplanos aleatórios (com semente fixa) usados nas assinaturas SimHash."""
+    return np.random.default_rng(0).standard_normal((dim, SIMHASH_BITS)).astype(np.float32)
+
+def simhash_signatures(matrix: np.ndarray) -> np.ndarray:
+    """
+    Calcula a assinatura SimHash de 64 bits de cada linha da matriz.
+    
+    Cada bit indica de que lado de um hiperplano aleatório o vetor está, então
+    vetores com cosseno alto diferem em poucos bits.
+    
+    Args:
+        matrix: Matriz com um embedding por linha
+        
+    Returns:
+        Vetor uint64 com uma assinatura por linha
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    bits = (matrix @ _simhash_hyperplanes(matrix.shape[1])) > 0
+    return np.packbits(bits, axis=1).view('>u8').astype(np.uint64).ravel()
+
+def hamming_distances(signatures: np.ndarray, query_signature: np.uint64) -> np.ndarray:
+    """
+    Calcula a distância de Hamming entre cada assinatura e a da consulta.
+    
+    Args:
+        signatures: Vetor uint64 de assinaturas
+        query_signature: Assinatura da consulta
+        
+    Returns:
+        Vetor com a quantidade de bits diferentes para cada assinatura
+    """
+    diff = np.bitwise_xor(signatures, np.uint64(query_signature))
+    return np.unpackbits(diff.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
 class DocumentProcessor:
     """
     Classe responsável por processar e gerenciar documentos para a base de conhecimento.
@@ -56,26 +311,33 @@ class DocumentProcessor:
     
     def __init__(self):
         """Inicializa o processador de documentos e carrega o índice."""
+        self._lock = threading.RLock()
+        self.index_mtime_ns = _index_mtime_ns()
         self.documents_index = self._load_index()
+        self.index_version = index_version(self.documents_index)
+        # Matriz de busca da coleção, carregada na primeira busca (veja _ensure_matrix)
+        self._corpus = None
         
     def _load_index(self) -> Dict[str, Any]:
         """Carrega o índice de documentos do arquivo JSON."""
         if os.path.exists(INDEX_FILE):
             try:
-                with open(INDEX_FILE, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                return load_json_file(INDEX_FILE)
             except Exception as e:
-                print(f"Erro ao carregar índice: {e}")
+                log.error("Erro ao carregar índice: %s", e)
                 return {}
         return {}
     
     def _save_index(self) -> None:
         """Salva o índice de documentos no arquivo JSON."""
         try:
-            with open(INDEX_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.documents_index, f, ensure_ascii=False, indent=2)
+            with self._lock:
+                write_json_file(INDEX_FILE, self.documents_index)
+                # O índice em memória é a versão mais recente; não recarregá-lo do disco
+                self.index_mtime_ns = _index_mtime_ns()
+                self.index_version = index_version(self.documents_index)
         except Exception as e:
-            print(f"Erro ao salvar índice: {e}")
+            log.error("Erro ao salvar índice: %s", e)
             
     def get_document_list(self) -> List[Dict[str, Any]]:
         """Retorna a lista de documentos disponíveis no índice."""
@@ -105,18 +367,27 @@ class DocumentProcessor:
         if file_ext == '.docx' and not DOCX_AVAILABLE:
             raise ImportError("python-docx é necessário para processar arquivos DOCX. Instale com: pip install python-docx")
         
-        # Criar ID único com base no conteúdo e nome do arquivo
-        with open(file_path, 'rb') as f:
-            file_content = f.read()
-            doc_id = hashlib.md5(file_content + os.path.basename(file_path).encode()).hexdigest()
-        
-        # Nome do arquivo de destino
-        dest_filename = f"{doc_id}{file_ext}"
-        dest_path = os.path.join(DOCUMENTS_DIR, dest_filename)
-        
-        # Copiar arquivo para o diretório de documentos
-        with open(file_path, 'rb') as src, open(dest_path, 'wb') as dst:
-            dst.write(src.read())
+        # Copiar o arquivo para o diretório de documentos e calcular o ID único (conteúdo
+        # e nome do arquivo) na mesma leitura; o destino só recebe o nome final depois.
+        # BLAKE2b com 16 bytes mantém IDs de 32 caracteres hexadecimais, como o MD5
+        file_hash = hashlib.blake2b(digest_size=16)
+        tmp_path = os.path.join(DOCUMENTS_DIR, f".tmp_{os.getpid()}_{time.time_ns()}{file_ext}")
+        try:
+            with open(file_path, 'rb') as src, open(tmp_path, 'wb', buffering=1 << 20) as dst:
+                for block in iter(lambda: src.read(1 << 20), b''):
+                    file_hash.update(block)
+                    dst.write(block)
+            file_hash.update(os.path.basename(file_path).encode())
+            doc_id = file_hash.hexdigest()
+            
+            # Nome do arquivo de destino
+            dest_filename = f"{doc_id}{file_ext}"
+            dest_path = os.path.join(DOCUMENTS_DIR, dest_filename)
+            os.replace(tmp_path, dest_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
             
         # Extrair texto do documento
         text = self._extract_text_from_file(dest_path)
@@ -124,8 +395,11 @@ class DocumentProcessor:
         # Processar e segmentar o texto
         chunks = self._split_text(text, doc_id)
         
+        # Gerar os embeddings dos chunks em lotes (uma requisição para vários chunks)
+        self._embed_chunks(chunks)
+        
         # Salvar os chunks
-        self._save_chunks(chunks, doc_id)
+        chunks_hash = self._save_chunks(chunks, doc_id)
         
         # Adicionar documento ao índice
         if not title:
@@ -139,7 +413,8 @@ class DocumentProcessor:
             "original_filename": os.path.basename(file_path),
             "file_type": file_ext[1:],  # remover o ponto
             "added_date": datetime.datetime.now().isoformat(),
-            "num_chunks": len(chunks)
+            "num_chunks": len(chunks),
+            "chunks_hash": chunks_hash
         }
         
         self.documents_index[doc_id] = document_info
@@ -160,56 +435,64 @@ class DocumentProcessor:
         try:
             # Verificar se o documento existe no índice
             if doc_id not in self.documents_index:
-                print(f"Documento com ID {doc_id} não encontrado no índice")
+                log.warning("Documento com ID %s não encontrado no índice", doc_id)
                 return False
             
             # Obter informações do documento
             doc_info = self.documents_index[doc_id]
-            print(f"Removendo documento: {doc_info['title']} (ID: {doc_id})")
+            log.info("Removendo documento: %s (ID: %s)", doc_info['title'], doc_id)
             
             # Caminhos dos arquivos a serem removidos
             doc_file = os.path.join(DOCUMENTS_DIR, doc_info['filename'])
             chunks_file = os.path.join(CHUNKS_DIR, f"{doc_id}.json")
+            embeddings_file = os.path.join(CHUNKS_DIR, f"{doc_id}.npy")
             
             # Remover arquivo do documento (se existir)
             if os.path.exists(doc_file):
                 try:
                     os.remove(doc_file)
-                    print(f"Arquivo do documento removido: {doc_file}")
+                    log.info("Arquivo do documento removido: %s", doc_file)
                 except Exception as e:
-                    print(f"Erro ao remover arquivo do documento: {str(e)}")
+                    log.error("Erro ao remover arquivo do documento: %s", e)
             else:
-                print(f"Arquivo do documento não encontrado: {doc_file}")
+                log.warning("Arquivo do documento não encontrado: %s", doc_file)
             
             # Remover arquivo de chunks (se existir)
             if os.path.exists(chunks_file):
                 try:
                     os.remove(chunks_file)
-                    print(f"Arquivo de chunks removido: {chunks_file}")
+                    log.info("Arquivo de chunks removido: %s", chunks_file)
                 except Exception as e:
-                    print(f"Erro ao remover arquivo de chunks: {str(e)}")
+                    log.error("Erro ao remover arquivo de chunks: %s", e)
             else:
-                print(f"Arquivo de chunks não encontrado: {chunks_file}")
+                log.warning("Arquivo de chunks não encontrado: %s", chunks_file)
+            
+            # Remover arquivo de embeddings (se existir)
+            try:
+                os.remove(embeddings_file)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                log.error("Erro ao remover arquivo de embeddings: %s", e)
             
             # Remover documento do índice
             del self.documents_index[doc_id]
             self._save_index()
-            print(f"Documento removido do índice com sucesso")
+            log.info("Documento removido do índice com sucesso")
             
             return True
             
         except Exception as e:
-            import traceback
-            print(f"Erro ao remover documento: {str(e)}")
-            traceback.print_exc()
+            log.exception("Erro ao remover documento: %s", e)
             return False
     
-    def reprocess_document(self, doc_id: str) -> Tuple[bool, str]:
+    def reprocess_document(self, doc_id: str, batch_size: int = 100) -> Tuple[bool, str]:
         """
-        Reprocessa um documento existente para atualizar seus chunks.
+        Reprocessa um documento existente para atualizar seus chunks e embeddings.
         
         Args:
             doc_id: ID do documento a ser reprocessado
+            batch_size: Número máximo de chunks por requisição de embeddings
             
         Returns:
             Tupla (sucesso, mensagem)
@@ -219,39 +502,68 @@ class DocumentProcessor:
             if doc_id not in self.documents_index:
                 return False, f"Documento com ID {doc_id} não encontrado"
             
-            # Obter informações do documento
-            doc_info = self.documents_index[doc_id]
-            print(f"Reprocessando documento: {doc_info['title']} (ID: {doc_id})")
-            
-            # Caminho do arquivo do documento
-            doc_file = os.path.join(DOCUMENTS_DIR, doc_info['filename'])
-            
-            # Verificar se o arquivo existe
-            if not os.path.exists(doc_file):
-                return False, f"Arquivo do documento não encontrado: {doc_file}"
-            
-            # Extrair texto do documento
-            try:
-                text = self._extract_text_from_file(doc_file)
-            except Exception as e:
-                return False, f"Erro ao extrair texto: {str(e)}"
-            
-            # Processar o texto em chunks
-            chunks = self._split_text(text, doc_id)
-            
-            # Salvar os novos chunks
-            self._save_chunks(chunks, doc_id)
-            
-            return True, f"Documento '{doc_info['title']}' reprocessado com sucesso!"
+            success, message = self._rebuild_chunks(doc_id, batch_size)
+            if success:
+                self._save_index()
+            return success, message
             
         except Exception as e:
-            print(f"Erro ao reprocessar documento: {str(e)}")
+            log.error("Erro ao reprocessar documento: %s", e)
             return False, f"Erro ao reprocessar documento: {str(e)}"
     
-    def reprocess_all_documents(self) -> Tuple[bool, str]:
+    def _rebuild_chunks(self, doc_id: str, batch_size: int = 100) -> Tuple[bool, str]:
+        """
+        Extrai, divide e gera os embeddings de um documento, salvando seus chunks.
+        
+        Atualiza a contagem de chunks em memória, mas não salva o índice;
+        quem chama decide quando persisti-lo.
+        
+        Args:
+            doc_id: ID do documento
+            batch_size: Número máximo de chunks por requisição de embeddings
+            
+        Returns:
+            Tupla (sucesso, mensagem)
+        """
+        # Obter informações do documento
+        doc_info = self.documents_index[doc_id]
+        log.info("Reprocessando documento: %s (ID: %s)", doc_info['title'], doc_id)
+        
+        # Caminho do arquivo do documento
+        doc_file = os.path.join(DOCUMENTS_DIR, doc_info['filename'])
+        
+        # Verificar se o arquivo existe
+        if not os.path.exists(doc_file):
+            return False, f"Arquivo do documento não encontrado: {doc_file}"
+        
+        # Extrair texto do documento
+        try:
+            text = self._extract_text_from_file(doc_file)
+        except Exception as e:
+            return False, f"Erro ao extrair texto: {str(e)}"
+        
+        # Processar o texto em chunks
+        chunks = self._split_text(text, doc_id)
+        
+        # Gerar os embeddings dos chunks em lotes, reaproveitando os de trechos inalterados
+        self._embed_chunks(chunks, batch_size, self._existing_embeddings(doc_id))
+        
+        # Salvar os novos chunks e atualizar a contagem no índice
+        doc_info["chunks_hash"] = self._save_chunks(chunks, doc_id)
+        doc_info["num_chunks"] = len(chunks)
+        
+        return True, f"Documento '{doc_info['title']}' reprocessado com sucesso!"
+    
+    def reprocess_all_documents(self, batch_size: int = 100, max_workers: int = 4) -> Tuple[bool, str]:
         """
         Reprocessa todos os documentos, gerando embeddings para todos os chunks.
         
+        Os documentos são reprocessados em paralelo e o índice é salvo uma única vez no final.
+        
+        Args:
+            batch_size: Número máximo de chunks por requisição de embeddings
+            max_workers: Número máximo de documentos reprocessados ao mesmo tempo
+            
         Returns:
             Tupla com (sucesso, mensagem)
         """
@@ -262,28 +574,40 @@ class DocumentProcessor:
             if not docs:
                 return False, "Nenhum documento encontrado no índice"
             
-            print(f"Reprocessando {len(docs)} documentos...")
+            log.info("Reprocessando %d documentos...", len(docs))
             
-            # Reprocessar cada documento
+            # Selecionar os documentos cujo arquivo ainda existe
+            pending = []
             for doc_id in docs:
                 doc_info = self.documents_index[doc_id]
-                doc_path = doc_info.get("path", "")
+                doc_path = os.path.join(DOCUMENTS_DIR, doc_info.get("filename", ""))
                 
-                if not doc_path or not os.path.exists(doc_path):
-                    print(f"Caminho não encontrado para documento {doc_id}: {doc_path}")
+                if not doc_info.get("filename") or not os.path.exists(doc_path):
+                    log.warning("Caminho não encontrado para documento %s: %s", doc_id, doc_path)
                     continue
-                    
-                print(f"Reprocessando documento: {doc_info.get('name', doc_id)}")
-                
-                # Reprocessar o documento
-                self.reprocess_document(doc_id)
+                pending.append(doc_id)
+            
+            def rebuild(doc_id: str) -> bool:
+                try:
+                    success, _ = self._rebuild_chunks(doc_id, batch_size)
+                    return success
+                except Exception as e:
+                    log.error("Erro ao reprocessar documento %s: %s", doc_id, e)
+                    return False
+            
+            # Extração e embeddings são limitados por I/O e rede, então threads bastam
+            reprocessed = 0
+            if pending:
+                with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending)))) as executor:
+                    reprocessed = sum(executor.map(rebuild, pending))
             
-            return True, f"Reprocessados {len(docs)} documentos com sucesso"
+            self._save_index()
+            
+            return True, f"Reprocessados {reprocessed} de {len(docs)} documentos com sucesso"
             
         except Exception as e:
             error_msg = f"Erro ao reprocessar documentos: {str(e)}"
-            print(error_msg)
-            traceback.print_exc()
+            log.exception(error_msg)
             return False, error_msg
     
     def _extract_text_from_file(self, file_path: str) -> str:
@@ -300,24 +624,28 @@ class DocumentProcessor:
         if not os.path.exists(file_path):
             return f"ERRO: Arquivo não encontrado: {file_path}"
         
+        # PDFs são lidos diretamente com o PyMuPDF, que o loader do LangChain usaria de qualquer forma
+        if os.path.splitext(file_path)[1].lower() == '.pdf' and PYMUPDF_AVAILABLE:
+            return self._extract_text_from_pdf(file_path)
+        
         # Verificar se o LangChain está disponível
         try:
             from langchain_community.vectorstores import FAISS
             from langchain_openai import OpenAIEmbeddings
             from langchain_core.documents import Document
             LANGCHAIN_AVAILABLE = True
-            print("LangChain está disponível e importado com sucesso!")
+            log.debug("LangChain está disponível e importado com sucesso!")
         except ImportError as e:
-            print(f"LangChain não está disponível: {e}")
+            log.warning("LangChain não está disponível: %s", e)
             LANGCHAIN_AVAILABLE = False
         except Exception as e:
-            print(f"Erro ao importar LangChain: {e}")
+            log.error("Erro ao importar LangChain: %s", e)
             LANGCHAIN_AVAILABLE = False
         
         # Usar LangChain se disponível
         if LANGCHAIN_AVAILABLE:
             try:
-                print(f"Usando LangChain para extrair texto de {file_path}")
+                log.debug("Usando LangChain para extrair texto de %s", file_path)
                 file_ext = os.path.splitext(file_path)[1].lower()
                 
                 if file_ext == '.pdf':
@@ -336,28 +664,19 @@ class DocumentProcessor:
                     return "\n\n".join([doc.page_content for doc in documents])
                 
                 else:
-                    print(f"LangChain: Tipo de arquivo não suportado: {file_ext}")
+                    log.warning("LangChain: Tipo de arquivo não suportado: %s", file_ext)
                     # Fallback para método padrão
             
             except Exception as e:
-                print(f"Erro ao usar LangChain para extrair texto: {str(e)}")
-                print("Voltando ao método padrão de extração")
+                log.error("Erro ao usar LangChain para extrair texto: %s", e)
+                log.warning("Voltando ao método padrão de extração")
         
         # Método padrão se LangChain não estiver disponível ou falhar
-        print(f"Usando método padrão para extrair texto de {file_path}")
+        log.debug("Usando método padrão para extrair texto de %s", file_path)
         file_ext = os.path.splitext(file_path)[1].lower()
         
         if file_ext == '.pdf' and PYMUPDF_AVAILABLE:
-            # Para arquivos PDF, usa PyMuPDF
-            text = ""
-            try:
-                with fitz.open(file_path) as doc:
-                    for page in doc:
-                        text += page.get_text() + "\n\n"
-                return text
-            except Exception as e:
-                print(f"Erro ao processar PDF: {str(e)}")
-                return f"ERRO AO PROCESSAR PDF: {str(e)}"
+            return self._extract_text_from_pdf(file_path)
         
         elif file_ext == '.txt' or file_ext == '.md':
             # Para arquivos de texto, lê diretamente
@@ -369,7 +688,7 @@ class DocumentProcessor:
                 with open(file_path, 'r', encoding='latin-1') as f:
                     return f.read()
             except Exception as e:
-                print(f"Erro ao ler arquivo de texto: {str(e)}")
+                log.error("Erro ao ler arquivo de texto: %s", e)
                 return f"ERRO AO LER ARQUIVO: {str(e)}"
         
         elif file_ext == '.docx' and DOCX_AVAILABLE:
@@ -381,13 +700,51 @@ class DocumentProcessor:
                     text += para.text + "\n"
                 return text
             except Exception as e:
-                print(f"Erro ao processar DOCX: {str(e)}")
+                log.error("Erro ao processar DOCX: %s", e)
                 return f"ERRO AO PROCESSAR DOCX: {str(e)}"
             
         else:
             # Para outros tipos de arquivo, retorna uma mensagem
             return f"Tipo de arquivo não suportado: {file_ext}"
     
+    def _extract_text_from_pdf(self, file_path: str) -> str:
+        """
+        Extrai o texto de um PDF com PyMuPDF.
+        
+        Args:
+            file_path: Caminho para o arquivo PDF
+            
+        Returns:
+            Texto das páginas, separadas por linhas em branco
+        """
+        # Apenas texto simples: hifenização desfeita e ligaduras expandidas, sem reordenar blocos
+        flags = fitz.TEXT_DEHYPHENATE | fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_MEDIABOX_CLIP
+        
+        def extract_range(start: int, stop: int) -> List[str]:
+            # Cada thread abre o próprio documento: objetos do PyMuPDF não são compartilháveis
+            with fitz.open(file_path) as doc:
+                return [doc[page_num].get_text("text", flags=flags, sort=False) for page_num in range(start, stop)]
+        
+        try:
+            with fitz.open(file_path) as doc:
+                page_count = doc.page_count
+                if page_count < PDF_PARALLEL_MIN_PAGES:
+                    parts = [page.get_text("text", flags=flags, sort=False) for page in doc]
+                    return "\n\n".join(parts) + "\n\n"
+            
+            # PDFs grandes: dividir as páginas em faixas extraídas em paralelo
+            # (o MuPDF libera o GIL durante a extração)
+            workers = min(PDF_EXTRACTION_WORKERS, os.cpu_count() or 1)
+            step = -(-page_count // workers)
+            ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+            with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+                slices = executor.map(lambda r: extract_range(*r), ranges)
+                parts = [part for page_texts in slices for part in page_texts]
+            return "\n\n".join(parts) + "\n\n"
+        except Exception as e:
+            log.error("Erro ao processar PDF: %s", e)
+            return f"ERRO AO PROCESSAR PDF: {str(e)}"
+    
     def _split_text(self, text: str, doc_id: str) -> List[Dict[str, Any]]:
         """
         Divide o texto em chunks menores para processamento.
@@ -399,91 +756,112 @@ class DocumentProcessor:
         Returns:
             Lista de chunks processados
         """
-        if LANGCHAIN_AVAILABLE:
-            # Usar LangChain para dividir o texto
-            try:
-                print(f"Usando LangChain para dividir o texto do documento {doc_id}")
-                # Criar um text splitter com configurações otimizadas
-                text_splitter = RecursiveCharacterTextSplitter(
-                    chunk_size=1000,
-                    chunk_overlap=100,
-                    length_function=len,
-                    separators=["\n\n", "\n", " ", ""]
-                )
-                
-                # Dividir o texto em chunks
-                langchain_chunks = text_splitter.split_text(text)
-                
-                # Converter para o nosso formato de chunks
-                chunks = []
-                for i, chunk_text in enumerate(langchain_chunks):
-                    chunk = {
-                        "id": f"{doc_id}_chunk_{i+1}",
-                        "doc_id": doc_id,
-                        "text": chunk_text.strip(),
-                        "embedding": None
-                    }
-                    chunks.append(chunk)
-                
-                print(f"LangChain dividiu o texto em {len(chunks)} chunks")
-                return chunks
-            except Exception as e:
-                print(f"Erro ao usar LangChain para dividir texto: {str(e)}")
-                print("Voltando ao método de divisão padrão")
-                # Em caso de erro, voltar ao método padrão
-        
-        # Método padrão se LangChain não estiver disponível ou falhar
-        print(f"Usando método padrão para dividir o texto do documento {doc_id}")
         chunks = []
-        chunk_id = 1
-        
-        # Método alternativo simples de divisão de texto
-        # Dividir por parágrafos e depois combinar para chunks de tamanho aproximado
-        paragraphs = text.split("\n\n")
-        current_chunk = ""
-        
-        for para in paragraphs:
-            if len(current_chunk) + len(para) < 1000:
-                current_chunk += para + "\n\n"
-            else:
-                if current_chunk:
-                    chunk = {
-                        "id": f"{doc_id}_chunk_{chunk_id}",
-                        "doc_id": doc_id,
-                        "text": current_chunk.strip(),
-                        "embedding": None
-                    }
-                    chunks.append(chunk)
-                    chunk_id += 1
-                current_chunk = para + "\n\n"
-        
-        # Adicionar o último chunk se houver conteúdo
-        if current_chunk:
-            chunk = {
-                "id": f"{doc_id}_chunk_{chunk_id}",
+        for chunk_text in split_text_into_chunks(text, CHUNK_SIZE, CHUNK_OVERLAP):
+            chunks.append({
+                "id": f"{doc_id}_chunk_{len(chunks) + 1}",
                 "doc_id": doc_id,
-                "text": current_chunk.strip(),
+                "text": chunk_text,
+                "text_hash": text_hash(chunk_text),
                 "embedding": None
-            }
-            chunks.append(chunk)
+            })
         
-        print(f"Método padrão dividiu o texto em {len(chunks)} chunks")
+        log.debug("Texto do documento %s dividido em %s chunks", doc_id, len(chunks))
         return chunks
     
-    def _save_chunks(self, chunks: List[Dict[str, Any]], doc_id: str) -> None:
+    def _embed_chunks(self, chunks: List[Dict[str, Any]], batch_size: int = 100,
+                      known_embeddings: Optional[Dict[str, List[float]]] = None) -> None:
         """
-        Salva os chunks de um documento em um arquivo JSON.
+        Preenche o embedding de cada chunk, enviando os textos em lotes à API.
+        
+        Args:
+            chunks: Lista de chunks a serem atualizados
+            batch_size: Número máximo de chunks por requisição
+            known_embeddings: Embeddings já calculados, indexados pelo hash do texto;
+                              chunks com texto inalterado os reaproveitam sem chamar a API
+        """
+        known_embeddings = known_embeddings or {}
+        pending = []
+        for chunk in chunks:
+            embedding = known_embeddings.get(chunk["text_hash"])
+            if embedding is not None:
+                chunk["embedding"] = embedding
+            else:
+                pending.append(chunk)
+        
+        embeddings = generate_embeddings([chunk["text"] for chunk in pending], batch_size)
+        for chunk, embedding in zip(pending, embeddings):
+            chunk["embedding"] = embedding or None
+        
+        log.debug("Embeddings gerados para %d de %d chunks (%d reaproveitados)",
+                  sum(1 for e in embeddings if e), len(pending), len(chunks) - len(pending))
+    
+    def _existing_embeddings(self, doc_id: str) -> Dict[str, List[float]]:
+        """
+        Retorna os embeddings atuais de um documento, indexados pelo hash do texto do chunk.
+        
+        Args:
+            doc_id: ID do documento
+            
+        Returns:
+            Dicionário {hash do texto: embedding}
+        """
+        chunks = self.get_document_chunks(doc_id)
+        doc_embeddings = self.get_document_embeddings(doc_id) if any("embedding_row" in c for c in chunks) else None
+        
+        known = {}
+        for chunk in chunks:
+            if doc_embeddings is not None and "embedding_row" in chunk:
+                embedding = doc_embeddings[chunk["embedding_row"]].astype(np.float32).tolist()
+            else:
+                embedding = chunk.get("embedding")
+            if embedding:
+                known[chunk.get("text_hash") or text_hash(chunk["text"])] = embedding
+        return known
+    
+    def _save_chunks(self, chunks: List[Dict[str, Any]], doc_id: str) -> Optional[str]:
+        """
+        Salva os chunks de um documento.
+        
+        O texto e os metadados vão para um arquivo JSON; os embeddings vão para um
+        arquivo .npy ao lado (normalizados e quantizados em int8), e cada chunk guarda a linha do seu embedding
+        em "embedding_row".
         
         Args:
             chunks: Lista de chunks a serem salvos
             doc_id: ID do documento
+            
+        Returns:
+            Hash do conteúdo salvo (textos e embeddings), guardado no índice em "chunks_hash",
+            ou None em caso de erro
         """
         chunks_path = os.path.join(CHUNKS_DIR, f"{doc_id}.json")
+        embeddings_path = os.path.join(CHUNKS_DIR, f"{doc_id}.npy")
         try:
-            with open(chunks_path, 'w', encoding='utf-8') as f:
-                json.dump(chunks, f, ensure_ascii=False, indent=2)
+            digest = hashlib.blake2b(digest_size=16)
+            stored_chunks = []
+            vectors = []
+            for chunk in chunks:
+                stored = {key: value for key, value in chunk.items() if key != "embedding"}
+                if chunk.get("embedding"):
+                    stored["embedding_row"] = len(vectors)
+                    vectors.append(chunk["embedding"])
+                stored_chunks.append(stored)
+                digest.update(chunk["text"].encode('utf-8'))
+                digest.update(b"\0")
+            
+            if vectors:
+                quantized = quantize_embeddings(vectors)
+                np.save(embeddings_path, quantized)
+                digest.update(quantized.tobytes())
+            elif os.path.exists(embeddings_path):
+                os.remove(embeddings_path)
+            
+            write_json_file(chunks_path, stored_chunks)
+            return digest.hexdigest()
         except Exception as e:
-            print(f"Erro ao salvar chunks: {e}")
+            log.error("Erro ao salvar chunks: %s", e)
+            return None
     
     def get_document_chunks(self, doc_id: str) -> List[Dict[str, Any]]:
         """
@@ -493,142 +871,342 @@ class DocumentProcessor:
             doc_id: ID do documento
             
         Returns:
-            Lista de chunks do documento
+            Lista de chunks do documento (sem os embeddings; veja get_document_embeddings).
+            A lista é compartilhada entre chamadas e não deve ser modificada.
         """
         chunks_path = os.path.join(CHUNKS_DIR, f"{doc_id}.json")
-        if not os.path.exists(chunks_path):
+        try:
+            mtime_ns = os.stat(chunks_path).st_mtime_ns
+        except FileNotFoundError:
             return []
             
         try:
-            with open(chunks_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return _load_chunks_file(chunks_path, mtime_ns)
         except Exception as e:
-            print(f"Erro ao carregar chunks: {e}")
+            log.error("Erro ao carregar chunks: %s", e)
             return []
+    
+    def get_document_embeddings(self, doc_id: str) -> Optional[np.ndarray]:
+        """
+        Recupera a matriz de embeddings de um documento, mapeada em memória.
+        
+        Args:
+            doc_id: ID do documento
+            
+        Returns:
+            Matriz int8 (uma linha por chunk com embedding) ou None se não houver
+        """
+        embeddings_path = os.path.join(CHUNKS_DIR, f"{doc_id}.npy")
+        try:
+            return np.load(embeddings_path, mmap_mode='r')
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            log.error("Erro ao carregar embeddings: %s", e)
+            return None
+            
+    def _ensure_matrix(self) -> Dict[str, Any]:
+        """
+        Garante que a matriz de embeddings da coleção está carregada e atualizada.
+        
+        A matriz e as referências dos chunks ficam em CORPUS_EMBEDDINGS_FILE e
+        CORPUS_REFS_FILE, marcadas com a versão do índice. Se a versão não confere,
+        ambas são reconstruídas; caso contrário a matriz é apenas mapeada em memória.
+        
+        Returns:
+            Dicionário com "embedded" (pares [doc_id, posição do chunk], na ordem das
+            linhas), "matrix", "simhash" (assinaturas das linhas) e "text_only"
+            (pares dos chunks sem embedding)
+        """
+        with self._lock:
+            version = self.index_version
+            if self._corpus is not None and self._corpus["version"] == version:
+                return self._corpus
+            
+            corpus = None
+            try:
+                refs = load_json_file(CORPUS_REFS_FILE)
+                if refs.get("version") == version:
+                    matrix = np.load(CORPUS_EMBEDDINGS_FILE, mmap_mode='r')
+                    if matrix.dtype == np.int8 and matrix.shape[0] == len(refs["embedded"]):
+                        corpus = refs
+                        corpus["matrix"] = matrix
+            except (OSError, ValueError):
+                corpus = None
+            
+            if corpus is None:
+                corpus = self._build_search_corpus(version)
+            corpus["simhash"] = np.asarray(corpus["simhash"], dtype=np.uint64)
+            self._corpus = corpus
+            return corpus
+    
+    def _build_search_corpus(self, version: str) -> Dict[str, Any]:
+        """
+        Monta a matriz de embeddings da coleção a partir dos arquivos de cada documento.
+        
+        Args:
+            version: Versão do índice usada para marcar os arquivos gravados
+            
+        Returns:
+            Dicionário no formato de _ensure_matrix
+        """
+        embedded = []
+        text_only = []
+        rows = []
+        
+        for doc_id in self.documents_index:
+            chunks = self.get_document_chunks(doc_id)
+            doc_embeddings = None
+            if any("embedding_row" in chunk for chunk in chunks):
+                doc_embeddings = self.get_document_embeddings(doc_id)
+            
+            for position, chunk in enumerate(chunks):
+                if doc_embeddings is not None and "embedding_row" in chunk:
+                    rows.append(doc_embeddings[chunk["embedding_row"]])
+                elif chunk.get("embedding"):
+                    # Arquivos antigos guardam o embedding dentro do próprio JSON
+                    rows.append(chunk["embedding"])
+                else:
+                    text_only.append([doc_id, position])
+                    continue
+                embedded.append([doc_id, position])
+        
+        if rows:
+            # Linhas normalizadas e quantizadas em int8, como nos arquivos de cada documento
+            matrix = quantize_embeddings(rows)
+            signatures = simhash_signatures(matrix)
+        else:
+            matrix = np.empty((0, 0), dtype=np.int8)
+            signatures = np.empty(0, dtype=np.uint64)
+        
+        corpus = {
+            "version": version,
+            "embedded": embedded,
+            "text_only": text_only,
+            "simhash": [int(signature) for signature in signatures],
+        }
+        
+        # Gravar em arquivos temporários e renomear, para que outro processo nunca
+        # leia uma matriz pela metade; as referências (com a versão) vão por último
+        try:
+            temp_suffix = f".tmp_{os.getpid()}_{time.time_ns()}"
+            with open(CORPUS_EMBEDDINGS_FILE + temp_suffix, 'wb') as f:
+                np.save(f, matrix)
+            os.replace(CORPUS_EMBEDDINGS_FILE + temp_suffix, CORPUS_EMBEDDINGS_FILE)
+            write_json_file(CORPUS_REFS_FILE + temp_suffix, corpus)
+            os.replace(CORPUS_REFS_FILE + temp_suffix, CORPUS_REFS_FILE)
+            matrix = np.load(CORPUS_EMBEDDINGS_FILE, mmap_mode='r')
+        except OSError as e:
+            log.error("Erro ao salvar matriz de embeddings: %s", e)
+        
+        log.info("Matriz de busca montada com %d chunks", len(embedded))
+        corpus["matrix"] = matrix
+        return corpus
+    
+    def _resolve_refs(self, refs: List[List[Any]]) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Converte pares [doc_id, posição] nos pares (doc_id, chunk) correspondentes.
+        
+        Args:
+            refs: Referências de chunks, como guardadas na matriz da coleção
+            
+        Returns:
+            Lista de pares (doc_id, chunk)
+        """
+        doc_chunks = {}
+        resolved = []
+        for doc_id, position in refs:
+            chunks = doc_chunks.get(doc_id)
+            if chunks is None:
+                chunks = doc_chunks[doc_id] = self.get_document_chunks(doc_id)
+            resolved.append((doc_id, chunks[position]))
+        return resolved
+    
+    def _load_search_corpus(self, query_vector: Optional[np.ndarray] = None) -> Tuple[List[List[Any]], np.ndarray, List[Tuple[str, Dict[str, Any]]]]:
+        """
+        Obtém as linhas da matriz da coleção a serem comparadas com a consulta.
+        
+        Em coleções grandes, quando a consulta é informada, apenas as linhas cuja
+        assinatura SimHash está mais próxima da consulta são lidas do arquivo.
+        
+        Args:
+            query_vector: Embedding normalizado da consulta (opcional), usado na pré-seleção
+            
+        Returns:
+            Tupla com (referências [doc_id, posição] dos chunks com embedding, matriz int8
+            com os embeddings quantizados na mesma ordem, pares (doc_id, chunk) sem embedding)
+        """
+        corpus = self._ensure_matrix()
+        embedded_refs = corpus["embedded"]
+        matrix = corpus["matrix"]
+        
+        # Pré-seleção pela distância de Hamming entre assinaturas de 64 bits
+        if query_vector is not None and len(embedded_refs) >= SIMHASH_MIN_CHUNKS:
+            query_signature = simhash_signatures(query_vector[np.newaxis, :])[0]
+            distances = hamming_distances(corpus["simhash"], query_signature)
+            # Linhas em ordem crescente, para ler o arquivo mapeado sequencialmente
+            candidates = np.sort(np.argpartition(distances, SIMHASH_CANDIDATES)[:SIMHASH_CANDIDATES])
+            embedded_refs = [embedded_refs[i] for i in candidates]
+            matrix = matrix[candidates]
+        
+        return embedded_refs, matrix, self._resolve_refs(corpus["text_only"])
+    
+    def _text_search(self, query: str, refs: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        Busca textual simples: correspondência exata da consulta ou de palavras da consulta.
+        
+        Args:
+            query: Consulta em minúsculas
+            refs: Pares (doc_id, chunk) a serem verificados
+            
+        Returns:
+            Lista de chunks encontrados, com documento e similaridade
+        """
+        results = []
+        # Palavras da consulta calculadas uma única vez, e não para cada chunk
+        query_words = query.split()
+        long_words = [word for word in query_words if len(word) > 3]
+        
+        for doc_id, chunk in refs:
+            chunk_text = _lowercase(chunk["text"])
+            
+            # 1. Verificar correspondência exata
+            if query in chunk_text:
+                similarity = 0.5  # Valor médio para correspondências de texto exato
+            else:
+                # 2. Verificar correspondência parcial de palavras
+                matched_words = sum(1 for word in long_words if word in chunk_text)
+                
+                # Aceitar correspondências parciais
+                if matched_words == 0:
+                    continue
+                similarity = 0.3 * (matched_words / len(query_words))
+                log.debug("Fallback - correspondência parcial: %s/%s palavras", matched_words, len(query_words))
+            
+            results.append(self._search_result(doc_id, chunk, similarity))
+        
+        return results
+    
+    def _search_result(self, doc_id: str, chunk: Dict[str, Any], similarity: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Monta um resultado de busca sem copiar o chunk nem as informações do documento.
+        
+        Args:
+            doc_id: ID do documento
+            chunk: Chunk encontrado
+            similarity: Similaridade com a consulta (opcional)
             
-    def search_documents(self, query: str) -> List[Dict[str, Any]]:
+        Returns:
+            Dicionário com id, doc_id, text, document e similarity; o documento é
+            compartilhado com o índice e não deve ser modificado
+        """
+        result = {
+            "id": chunk["id"],
+            "doc_id": doc_id,
+            "text": chunk["text"],
+            "document": self.documents_index[doc_id],
+        }
+        if similarity is not None:
+            result["similarity"] = similarity
+        return result
+    
+    def search_documents(self, query: str, top_k: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Realiza uma busca nos documentos usando embeddings para comparação semântica.
         
         Args:
             query: Termo de busca
+            top_k: Número máximo de resultados (opcional; por padrão, todos)
             
         Returns:
             Lista de chunks que correspondem à busca, ordenados por relevância
         """
-        print(f"Realizando busca com embeddings para: '{query}'")
+        log.debug("Realizando busca com embeddings para: '%s'", query)
         query = query.lower()
         results = []
         
         try:
             # Gerar embedding para a consulta
             query_embedding = generate_embedding(query)
+            query_vector = None
+            if query_embedding:
+                query_vector = np.asarray(query_embedding, dtype=np.float32)
+                query_norm = np.linalg.norm(query_vector)
+                query_vector = query_vector / query_norm if query_norm > 0 else None
             
-            # Buscar em todos os documentos
-            for doc_id in self.documents_index:
-                chunks = self.get_document_chunks(doc_id)
+            # Carregar os chunks de todos os documentos, separando os que têm embedding
+            embedded_refs, embedding_matrix, text_only_refs = self._load_search_corpus(query_vector)
+            
+            # Similaridade de cosseno com todos os chunks de uma vez (linhas já normalizadas)
+            if query_vector is not None and embedded_refs:
+                similarities = quantized_scores(embedding_matrix, query_vector)
                 
-                for chunk in chunks:
-                    # Verificar se o chunk tem embedding
-                    chunk_embedding = chunk.get("embedding", [])
-                    
-                    if chunk_embedding:
-                        # Calcular similaridade
-                        similarity = cosine_similarity(query_embedding, chunk_embedding)
-                        
-                        # Adicionar à lista de resultados se tiver similaridade mínima
-                        if similarity > 0.05:  # Reduzido de 0.1 para 0.05 para ser mais permissivo
-                            # Adicionar informações do documento ao chunk
-                            doc_info = self.documents_index[doc_id].copy()
-                            chunk_with_doc = chunk.copy()
-                            chunk_with_doc["document"] = doc_info
-                            chunk_with_doc["similarity"] = similarity
-                            results.append(chunk_with_doc)
-                    else:
-                        # Fallback para busca textual se o chunk não tiver embedding
-                        chunk_text = chunk["text"].lower()
-                        
-                        # Busca textual mais avançada
-                        # 1. Verificar correspondência exata
-                        if query in chunk_text:
-                            doc_info = self.documents_index[doc_id].copy()
-                            chunk_with_doc = chunk.copy()
-                            chunk_with_doc["document"] = doc_info
-                            chunk_with_doc["similarity"] = 0.5  # Valor médio para correspondências de texto exato
-                            results.append(chunk_with_doc)
-                        else:
-                            # 2. Verificar correspondência parcial de palavras
-                            query_words = query.split()
-                            matched_words = sum(1 for word in query_words if len(word) > 3 and word in chunk_text)
-                            
-                            # Aceitar correspondências parciais
-                            if matched_words > 0:
-                                similarity_score = 0.3 * (matched_words / len(query_words))
-                                doc_info = self.documents_index[doc_id].copy()
-                                chunk_with_doc = chunk.copy()
-                                chunk_with_doc["document"] = doc_info
-                                chunk_with_doc["similarity"] = similarity_score
-                                results.append(chunk_with_doc)
-                                print(f"Fallback - correspondência parcial: {matched_words}/{len(query_words)} palavras")
+                # Adicionar à lista de resultados se tiver similaridade mínima
+                # (reduzido de 0.1 para 0.05 para ser mais permissivo)
+                hits = np.flatnonzero(similarities > 0.05)
+                # Apenas os top_k mais similares: seleção parcial em vez de ordenar todos
+                if top_k is not None and len(hits) > top_k:
+                    hits = hits[np.argpartition(-similarities[hits], top_k - 1)[:top_k]]
+                hit_refs = self._resolve_refs([embedded_refs[idx] for idx in hits])
+                for idx, (doc_id, chunk) in zip(hits, hit_refs):
+                    results.append(self._search_result(doc_id, chunk, float(similarities[idx])))
+            
+            # Fallback para busca textual nos chunks sem embedding
+            results.extend(self._text_search(query, text_only_refs))
             
             # Ordenar por similaridade (maior para menor)
             results.sort(key=lambda x: x.get("similarity", 0), reverse=True)
             
-            print(f"Encontrados {len(results)} resultados com embeddings")
+            log.debug("Encontrados %s resultados com embeddings", len(results))
             
         except Exception as e:
-            print(f"Erro na busca com embeddings: {str(e)}")
-            print("Fallback para busca textual simples")
+            log.error("Erro na busca com embeddings: %s", e)
+            log.warning("Fallback para busca textual simples")
             
             # Fallback para busca textual simples em caso de erro
-            for doc_id in self.documents_index:
-                chunks = self.get_document_chunks(doc_id)
-                
-                for chunk in chunks:
-                    chunk_text = chunk["text"].lower()
-                    
-                    # 1. Verificar correspondência exata
-                    if query in chunk_text:
-                        doc_info = self.documents_index[doc_id].copy()
-                        chunk_with_doc = chunk.copy()
-                        chunk_with_doc["document"] = doc_info
-                        chunk_with_doc["similarity"] = 0.5
-                        results.append(chunk_with_doc)
-                    else:
-                        # 2. Verificar correspondência parcial de palavras
-                        query_words = query.split()
-                        matched_words = sum(1 for word in query_words if len(word) > 3 and word in chunk_text)
-                        
-                        # Aceitar correspondências parciais
-                        if matched_words > 0:
-                            similarity_score = 0.3 * (matched_words / len(query_words))
-                            doc_info = self.documents_index[doc_id].copy()
-                            chunk_with_doc = chunk.copy()
-                            chunk_with_doc["document"] = doc_info
-                            chunk_with_doc["similarity"] = similarity_score
-                            results.append(chunk_with_doc)
-                            print(f"Fallback - correspondência parcial: {matched_words}/{len(query_words)} palavras")
+            all_refs = [(doc_id, chunk) for doc_id in self.documents_index for chunk in self.get_document_chunks(doc_id)]
+            results.extend(self._text_search(query, all_refs))
         
         # Se não encontramos nenhuma correspondência, pegar alguns chunks de cada documento
         if not results:
-            print("Nenhum resultado encontrado. Adicionando chunks de fallback.")
+            log.warning("Nenhum resultado encontrado. Adicionando chunks de fallback.")
             for doc_id in self.documents_index:
                 chunks = self.get_document_chunks(doc_id)
                 
                 # Pegar os 2 primeiros chunks de cada documento
                 fallback_chunks = chunks[:2]
                 for chunk in fallback_chunks:
-                    doc_info = self.documents_index[doc_id].copy()
-                    chunk_with_doc = chunk.copy()
-                    chunk_with_doc["document"] = doc_info
-                    results.append(chunk_with_doc)
+                    results.append(self._search_result(doc_id, chunk))
+        
+        if top_k is not None:
+            results = results[:top_k]
                     
         return results
 
+# Instância única do processador de documentos, compartilhada entre chamadas e threads
+_processor_instance: Optional[DocumentProcessor] = None
+_processor_lock = threading.Lock()
+
+def _index_mtime_ns() -> Optional[int]:
+    """Retorna a data de modificação do arquivo de índice em nanossegundos, ou None se não existir."""
+    try:
+        return os.stat(INDEX_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
 # Função para obter uma instância única do processador de documentos
 def get_document_processor() -> DocumentProcessor:
-    """Retorna uma instância do processador de documentos."""
-    return DocumentProcessor()
+    """
+    Retorna a instância única do processador de documentos.
+    
+    O índice só é lido novamente do disco quando o arquivo foi alterado por
+    outro processo ou fora do processador (por exemplo, ao reconstruí-lo).
+    """
+    global _processor_instance
+    with _processor_lock:
+        if _processor_instance is None or _processor_instance.index_mtime_ns != _index_mtime_ns():
+            _processor_instance = DocumentProcessor()
+        return _processor_instance
 
 # Função para facilitar a adição de documentos via interface
 def add_document_from_upload(uploaded_file, title=None, description=None) -> Tuple[bool, str]:
@@ -655,14 +1233,14 @@ def add_document_from_upload(uploaded_file, title=None, description=None) -> Tup
         if file_ext == '.pdf':
             try:
                 import fitz
-                print("PyMuPDF disponível para processamento")
+                log.debug("PyMuPDF disponível para processamento")
             except ImportError:
                 return False, "PyMuPDF (fitz) é necessário para processar PDFs. Instale com: pip install pymupdf"
                 
         if file_ext == '.docx':
             try:
                 import docx
-                print("python-docx disponível para processamento")
+                log.debug("python-docx disponível para processamento")
             except ImportError:
                 return False, "python-docx é necessário para processar arquivos DOCX. Instale com: pip install python-docx"
         
@@ -675,16 +1253,17 @@ def add_document_from_upload(uploaded_file, title=None, description=None) -> Tup
         temp_file_path = os.path.join(DOCUMENTS_DIR, f"temp_{safe_filename}")
         
         # Salvar o arquivo enviado
-        print(f"Salvando arquivo temporário: {temp_file_path}")
+        log.debug("Salvando arquivo temporário: %s", temp_file_path)
+        uploaded_file.seek(0)
         with open(temp_file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
+            shutil.copyfileobj(uploaded_file, f, 1 << 20)
             
         # Verificar se o arquivo foi salvo corretamente
         if not os.path.exists(temp_file_path):
             return False, "Falha ao salvar o arquivo temporário"
             
         file_size = os.path.getsize(temp_file_path)
-        print(f"Arquivo salvo com {file_size} bytes")
+        log.debug("Arquivo salvo com %s bytes", file_size)
         
         if file_size == 0:
             os.remove(temp_file_path)
@@ -693,18 +1272,18 @@ def add_document_from_upload(uploaded_file, title=None, description=None) -> Tup
         # Processar o documento
         try:
             processor = get_document_processor()
-            print(f"Processando documento: {temp_file_path}")
+            log.debug("Processando documento: %s", temp_file_path)
             
             # Adicionar o documento
             doc_id = processor.add_document(temp_file_path, title, description)
-            print(f"Documento processado com ID: {doc_id}")
+            log.debug("Documento processado com ID: %s", doc_id)
             
             # Remover o arquivo temporário após o processamento
             try:
                 os.remove(temp_file_path)
-                print(f"Arquivo temporário removido: {temp_file_path}")
+                log.debug("Arquivo temporário removido: %s", temp_file_path)
             except Exception as e:
-                print(f"Aviso: Não foi possível remover o arquivo temporário: {str(e)}")
+                log.warning("Não foi possível remover o arquivo temporário: %s", e)
             
             # Verificar se os chunks foram criados
             chunks_path = os.path.join(CHUNKS_DIR, f"{doc_id}.json")
@@ -714,25 +1293,21 @@ def add_document_from_upload(uploaded_file, title=None, description=None) -> Tup
                 return False, "O documento foi processado, mas os chunks não foram gerados."
                 
         except Exception as e:
-            import traceback
             error_msg = f"Erro ao processar documento: {str(e)}"
-            print(error_msg)
-            traceback.print_exc()
+            log.exception(error_msg)
             
             # Tentar remover o arquivo temporário em caso de erro
             try:
                 if os.path.exists(temp_file_path):
                     os.remove(temp_file_path)
-            except:
+            except OSError:
                 pass
                 
             return False, error_msg
             
     except Exception as e:
-        import traceback
         error_msg = f"Erro ao adicionar documento: {str(e)}"
-        print(error_msg)
-        traceback.print_exc()
+        log.exception(error_msg)
         return False, error_msg
 
 # Função para reconstruir o índice a partir dos arquivos existentes
@@ -751,16 +1326,24 @@ def rebuild_document_index() -> bool:
         
         # Verificar documentos existentes
         if not os.path.exists(DOCUMENTS_DIR):
-            print(f"Diretório de documentos não existe: {DOCUMENTS_DIR}")
+            log.warning("Diretório de documentos não existe: %s", DOCUMENTS_DIR)
             return False
             
         # Verificar chunks existentes
         if not os.path.exists(CHUNKS_DIR):
-            print(f"Diretório de chunks não existe: {CHUNKS_DIR}")
+            log.warning("Diretório de chunks não existe: %s", CHUNKS_DIR)
             return False
             
         # Listar arquivos de chunks (eles contêm os IDs de documento)
-        chunk_files = [f for f in os.listdir(CHUNKS_DIR) if f.endswith('.json')]
+        with os.scandir(CHUNKS_DIR) as entries:
+            chunk_files = [entry.name for entry in entries if entry.name.endswith('.json') and entry.is_file()]
+        
+        # Mapear cada ID de documento ao seu arquivo, com uma única leitura do diretório
+        docs_by_id = {}
+        with os.scandir(DOCUMENTS_DIR) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    docs_by_id.setdefault(os.path.splitext(entry.name)[0], entry.name)
         
         # Para cada arquivo de chunks
         for chunk_file in chunk_files:
@@ -768,20 +1351,16 @@ def rebuild_document_index() -> bool:
             doc_id = os.path.splitext(chunk_file)[0]
             
             # Procurar o arquivo do documento correspondente
-            document_files = os.listdir(DOCUMENTS_DIR)
-            matching_docs = [f for f in document_files if f.startswith(doc_id)]
+            doc_filename = docs_by_id.get(doc_id)
             
-            if matching_docs:
-                doc_filename = matching_docs[0]
+            if doc_filename:
                 file_ext = os.path.splitext(doc_filename)[1].lower()
                 
                 # Verificar número de chunks
                 chunks_path = os.path.join(CHUNKS_DIR, chunk_file)
                 try:
-                    with open(chunks_path, 'r', encoding='utf-8') as f:
-                        chunks = json.load(f)
-                        num_chunks = len(chunks)
-                except:
+                    num_chunks = len(load_json_file(chunks_path))
+                except (OSError, ValueError, TypeError):
                     num_chunks = 0
                 
                 # Criar entrada de índice
@@ -797,16 +1376,13 @@ def rebuild_document_index() -> bool:
                 }
         
         # Salvar o novo índice
-        with open(INDEX_FILE, 'w', encoding='utf-8') as f:
-            json.dump(new_index, f, ensure_ascii=False, indent=2)
+        write_json_file(INDEX_FILE, new_index)
             
-        print(f"Índice reconstruído com {len(new_index)} documentos")
+        log.info("Índice reconstruído com %s documentos", len(new_index))
         return True
         
     except Exception as e:
-        import traceback
-        print(f"Erro ao reconstruir índice: {str(e)}")
-        traceback.print_exc()
+        log.exception("Erro ao reconstruir índice: %s", e)
         return False
 
 # Função para buscar conhecimento relevante
@@ -823,132 +1399,30 @@ def get_relevant_knowledge(question: str, max_chunks: int = 10, max_chars: int =
     Returns:
         String contendo o conhecimento relevante
     """
-    print(f"\n=== Buscando conhecimento relevante para: '{question}' ===")
+    log.debug("=== Buscando conhecimento relevante para: '%s' ===", question)
     
     # Normalizar a pergunta (remover acentuação, converter para minúsculas)
     import unicodedata
     normalized_question = unicodedata.normalize('NFKD', question.lower())
     normalized_question = ''.join([c for c in normalized_question if not unicodedata.combining(c)])
-    print(f"Pergunta normalizada: '{normalized_question}'")
+    log.debug("Pergunta normalizada: '%s'", normalized_question)
     
-    # Verificar se podemos usar o LangChain
-    if LANGCHAIN_AVAILABLE:
-        try:
-            print("Tentando usar LangChain para busca de conhecimento relevante")
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key:
-                print("AVISO: OPENAI_API_KEY não está configurada para LangChain")
-                # Fallback para método padrão
-            else:
-                # Verificar documentos disponíveis
-                processor = get_document_processor()
-                document_list = processor.get_document_list()
-                
-                if not document_list:
-                    return "Não foram encontrados documentos na base de conhecimento."
-                
-                # Tentar construir um índice de vetores com FAISS
-                from langchain_community.vectorstores import FAISS  
-                from langchain_core.documents import Document  
-                
-                # Coletar documentos para indexar
-                documents = []
-                for doc_info in document_list:
-                    doc_id = doc_info["id"]
-                    chunks_file = os.path.join(processor.chunks_dir, f"{doc_id}.json")
-                    
-                    if os.path.exists(chunks_file):
-                        with open(chunks_file, 'r', encoding='utf-8') as f:
-                            doc_chunks = json.load(f)
-                            
-                        for chunk in doc_chunks:
-                            # Criar documento LangChain
-                            langchain_doc = Document(
-                                page_content=chunk["text"],
-                                metadata={
-                                    "doc_id": doc_id,
-                                    "chunk_id": chunk["id"],
-                                    "title": doc_info["title"]
-                                }
-                            )
-                            documents.append(langchain_doc)
-                
-                if not documents:
-                    return "Nenhum chunk de documento encontrado."
-                
-                print(f"Criando índice FAISS com {len(documents)} documentos")
-                
-                # Criar embeddings
-                embeddings = OpenAIEmbeddings(openai_api_key=api_key)
-                
-                # Criar vectorstore
-                try:
-                    db = FAISS.from_documents(documents, embeddings)
-                    
-                    # Realizar busca com mais resultados e menor limiar de similaridade
-                    k_search = max_chunks * 2  # Buscar mais resultados para ter mais opções
-                    similar_docs = db.similarity_search_with_score(normalized_question, k=k_search)
-                    
-                    # Construir resposta
-                    knowledge = ""
-                    for i, (doc, score) in enumerate(similar_docs):
-                        title = doc.metadata.get("title", "Desconhecido")
-                        chunk_text = doc.page_content
-                        
-                        # Verificar limite de caracteres
-                        if len(knowledge) + len(chunk_text) > max_chars:
-                            # Se o chunk for muito grande, tentar cortar para encaixar no limite
-                            remaining_space = max_chars - len(knowledge)
-                            if remaining_space > 100:  # Se tiver pelo menos 100 caracteres de espaço
-                                chunk_text = chunk_text[:remaining_space] + "..."
-                            else:
-                                break
-                        
-                        knowledge += f"\n--- Início do trecho {i+1} (de {title}, similaridade: {1-score:.4f}) ---\n"
-                        knowledge += chunk_text
-                        knowledge += f"\n--- Fim do trecho {i+1} ---\n"
-                        
-                        # Logging
-                        preview = chunk_text[:100] + "..." if len(chunk_text) > 100 else chunk_text
-                        print(f"LangChain - Chunk {i+1}: {preview}")
-                        print(f"  - Documento: {title}")
-                        print(f"  - Similaridade: {1-score:.4f}")
-                        print(f"  - Tamanho: {len(chunk_text)} caracteres")
-                    
-                    if knowledge:
-                        print(f"LangChain encontrou {len(similar_docs)} chunks relevantes")
-                        return knowledge
-                    else:
-                        return "LangChain não encontrou informações relevantes."
-                except ImportError as e:
-                    print(f"Erro ao usar FAISS: {e}")
-                    print("A biblioteca FAISS não está disponível, usando método padrão")
-                    # Continuar com o método padrão
-        except Exception as e:
-            print(f"Erro ao usar LangChain para busca: {str(e)}")
-            traceback.print_exc()
-            print("Voltando ao método padrão de busca")
-    
-    # Método padrão se LangChain não estiver disponível ou falhar
     # Obter o processador de documentos
     processor = get_document_processor()
     
-    # Buscar documentos relevantes
-    relevant_chunks = processor.search_documents(normalized_question)
-    
-    # Limitar o número de chunks para evitar exceder o contexto do LLM
-    if len(relevant_chunks) > max_chunks:
-        print(f"Limitando de {len(relevant_chunks)} para {max_chunks} chunks")
-        relevant_chunks = relevant_chunks[:max_chunks]
+    # Buscar documentos relevantes: a consulta é comparada com a matriz de embeddings
+    # da coleção (já normalizada) num único produto matriz-vetor
+    # (limitado a max_chunks para evitar exceder o contexto do LLM)
+    relevant_chunks = processor.search_documents(normalized_question, top_k=max_chunks)
     
-    print(f"Encontrados {len(relevant_chunks)} chunks relevantes")
+    log.debug("Encontrados %s chunks relevantes", len(relevant_chunks))
     
-    # Construir o contexto
-    knowledge = ""
+    # Construir o contexto: os trechos são acumulados numa lista e unidos no final
+    parts: List[str] = []
     total_chars = 0
     
     # Logging para ver quais chunks estão sendo enviados
-    print(f"\nChunks selecionados para a pergunta: '{question}'")
+    log.debug("Chunks selecionados para a pergunta: '%s'", question)
     
     for i, chunk in enumerate(relevant_chunks):
         chunk_text = chunk["text"]
@@ -967,32 +1441,89 @@ def get_relevant_knowledge(question: str, max_chunks: int = 10, max_chars: int =
                 break
                 
         # Adicionar o chunk ao conhecimento
-        knowledge += f"\n--- Início do trecho {i+1} (de {doc_title}) ---\n"
-        knowledge += chunk_text
-        knowledge += f"\n--- Fim do trecho {i+1} ---\n"
+        parts.append(f"\n--- Início do trecho {i+1} (de {doc_title}) ---\n")
+        parts.append(chunk_text)
+        parts.append(f"\n--- Fim do trecho {i+1} ---\n")
         
         # Atualizar contagem de caracteres
         total_chars += len(chunk_text)
         
-        # Logging
-        preview = chunk_text[:100] + "..." if len(chunk_text) > 100 else chunk_text
-        print(f"Chunk {i+1}: {preview}")
-        print(f"  - Documento: {doc_title}")
-        print(f"  - Similaridade: {similarity:.4f}")
-        print(f"  - Tamanho: {len(chunk_text)} caracteres")
+        # Logging (a prévia só é montada com o nível DEBUG ativo)
+        if log.isEnabledFor(logging.DEBUG):
+            preview = chunk_text[:100] + "..." if len(chunk_text) > 100 else chunk_text
+            log.debug("Chunk %s: %s\n  - Documento: %s\n  - Similaridade: %.4f\n  - Tamanho: %s caracteres",
+                      i+1, preview, doc_title, similarity, len(chunk_text))
         
-    print(f"\nTotal de caracteres enviados ao LLM: {total_chars}")
+    log.debug("Total de caracteres enviados ao LLM: %s", total_chars)
     
+    knowledge = "".join(parts)
     if not knowledge:
         knowledge = "Não foram encontradas informações relevantes nos documentos."
     
     return knowledge
 
+# Cache de embeddings de consultas, aberto na primeira utilização
+_query_cache: Optional[shelve.Shelf] = None
+_query_cache_failed = False  # Falha ao abrir: não tentar (nem registrar o erro) a cada consulta
+_query_cache_lock = threading.Lock()
+
+def _query_cache_key(text: str) -> str:
+    """Chave do cache: SHA-256 do modelo e do texto."""
+    return hashlib.sha256(f"{EMBEDDING_MODEL}\0{text}".encode('utf-8')).hexdigest()
+
+def _close_query_cache() -> None:
+    """
+    Fecha o cache de embeddings de consultas, gravando as alterações pendentes.
+    
+    Também limpa uma falha de abertura anterior, para que a próxima consulta
+    tente abrir o cache novamente (por exemplo, depois de os arquivos serem apagados).
+    """
+    global _query_cache, _query_cache_failed
+    with _query_cache_lock:
+        if _query_cache is not None:
+            _query_cache.close()
+            _query_cache = None
+        _query_cache_failed = False
+
+atexit.register(_close_query_cache)
+
+def _get_cached_embedding(key: str) -> Optional[List[float]]:
+    """Retorna o embedding guardado no cache de consultas, ou None se não houver."""
+    global _query_cache, _query_cache_failed
+    with _query_cache_lock:
+        if _query_cache is None:
+            if _query_cache_failed:
+                return None
+            try:
+                _query_cache = shelve.open(QUERY_EMBEDDINGS_CACHE)
+            except Exception as e:
+                _query_cache_failed = True
+                log.error("Erro ao abrir cache de embeddings; seguindo sem cache: %s", e)
+                return None
+        try:
+            return _query_cache.get(key)
+        except Exception as e:
+            log.error("Erro ao ler cache de embeddings: %s", e)
+            return None
+
+def _store_cached_embedding(key: str, embedding: List[float]) -> None:
+    """Guarda um embedding no cache de consultas."""
+    try:
+        with _query_cache_lock:
+            if _query_cache is not None:
+                _query_cache[key] = embedding
+                _query_cache.sync()
+    except Exception as e:
+        log.error("Erro ao gravar cache de embeddings: %s", e)
+
 # Função para gerar embeddings usando a API da OpenAI
 def generate_embedding(text: str) -> List[float]:
     """
     Gera um embedding para um texto usando a API da OpenAI.
     
+    Os embeddings gerados ficam em um cache persistente (QUERY_EMBEDDINGS_CACHE), de
+    modo que textos repetidos, como perguntas frequentes, não voltam a chamar a API.
+    
     Args:
         text: Texto para gerar embedding
         
@@ -1000,41 +1531,98 @@ def generate_embedding(text: str) -> List[float]:
         Lista de floats representando o embedding ou lista vazia em caso de erro
     """
     if not text or text.strip() == "":
-        print("AVISO: Texto vazio para embedding")
+        log.warning("Texto vazio para embedding")
         return []
         
     # Limitar o tamanho do texto para a API
     text = text[:8191]  # Limite para o modelo ada-002
     
+    cache_key = _query_cache_key(text)
+    cached = _get_cached_embedding(cache_key)
+    if cached:
+        return cached
+    
+    # Mesma requisição em lote usada no processamento dos documentos, com um único texto
+    embedding = generate_embeddings([text], batch_size=1)[0]
+    if embedding:
+        _store_cached_embedding(cache_key, embedding)
+    return embedding
+
+def generate_embeddings(texts: List[str], batch_size: int = 100, max_concurrency: int = 4,
+                        max_batch_chars: int = 100000) -> List[List[float]]:
+    """
+    Gera embeddings para vários textos, enviando-os em lotes à API da OpenAI.
+    
+    Os lotes são limitados por número de textos e por total de caracteres,
+    e enviados em paralelo, com no máximo max_concurrency requisições simultâneas.
+    
+    Args:
+        texts: Textos para gerar embeddings
+        batch_size: Número máximo de textos por requisição
+        max_concurrency: Número máximo de requisições simultâneas
+        max_batch_chars: Número máximo de caracteres somados por requisição
+        
+    Returns:
+        Lista de embeddings na mesma ordem dos textos (lista vazia para textos vazios ou em caso de erro)
+    """
+    embeddings: List[List[float]] = [[] for _ in texts]
+    
+    # A API rejeita entradas vazias; elas ficam sem embedding
+    pending = [i for i, text in enumerate(texts) if text and text.strip()]
+    if not pending:
+        return embeddings
+    
+    # Importa openai aqui para não quebrar na importação inicial
+    from openai import OpenAI
+    
+    # Verificar se a chave API está configurada
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        log.warning("OPENAI_API_KEY não está configurada")
+        return embeddings
+    
+    client = OpenAI(api_key=api_key)
     max_retries = 3
-    retry_count = 0
     
-    while retry_count < max_retries:
-        try:
-            # Importa openai aqui para não quebrar na importação inicial
-            from openai import OpenAI
-            
-            # Verificar se a chave API está configurada
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key:
-                print("AVISO: OPENAI_API_KEY não está configurada")
-                return []
-            
-            client = OpenAI(api_key=api_key)
-            response = client.embeddings.create(
-                input=text,
-                model="text-embedding-ada-002"
-            )
-            return response.data[0].embedding
-            
-        except Exception as e:
-            retry_count += 1
-            print(f"Erro ao gerar embedding (tentativa {retry_count}/{max_retries}): {str(e)}")
-            import time
-            time.sleep(2)  # Espera 2 segundos antes de tentar novamente
+    def embed_batch(batch: List[int]) -> None:
+        for retry_count in range(1, max_retries + 1):
+            try:
+                response = client.embeddings.create(
+                    input=[texts[i][:8191] for i in batch],  # Limite para o modelo ada-002
+                    model=EMBEDDING_MODEL
+                )
+                # Cada item da resposta traz o índice da entrada correspondente no lote
+                for item in response.data:
+                    embeddings[batch[item.index]] = item.embedding
+                return
+            except Exception as e:
+                log.error("Erro ao gerar embeddings do lote (tentativa %s/%s): %s", retry_count, max_retries, e)
+                time.sleep(2)  # Espera 2 segundos antes de tentar novamente
+        log.error("Falha ao gerar embeddings para %s textos após todas as tentativas", len(batch))
     
-    print("ERRO: Falha ao gerar embedding após todas as tentativas")
-    return []
+    # Agrupar os textos em lotes respeitando o número de entradas e o total de caracteres
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_chars = 0
+    for i in pending:
+        size = min(len(texts[i]), 8191)
+        if current and (len(current) >= batch_size or current_chars + size > max_batch_chars):
+            batches.append(current)
+            current, current_chars = [], 0
+        current.append(i)
+        current_chars += size
+    if current:
+        batches.append(current)
+    
+    # Um único lote (por exemplo, uma consulta) é enviado sem criar threads
+    if len(batches) == 1:
+        embed_batch(batches[0])
+        return embeddings
+    
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(batches))) as executor:
+        list(executor.map(embed_batch, batches))
+    
+    return embeddings
 
 def cosine_similarity(a: List[float], b: List[float]) -> float:
     """
@@ -1064,26 +1652,29 @@ def cosine_similarity(a: List[float], b: List[float]) -> float:
     return np.dot(a, b) / (a_norm * b_norm)
 
 # Função para reprocessar todos os documentos
-def reprocess_all_documents() -> Tuple[bool, str]:
+def reprocess_all_documents(batch_size: int = 100) -> Tuple[bool, str]:
     """
     Reprocessa todos os documentos, gerando embeddings para todos os chunks.
     
+    Args:
+        batch_size: Número máximo de chunks por requisição de embeddings
+        
     Returns:
         Tupla com (sucesso, mensagem)
     """
     try:
         processor = get_document_processor()
-        return processor.reprocess_all_documents()
+        return processor.reprocess_all_documents(batch_size)
     except Exception as e:
         error_msg = f"Erro ao reprocessar documentos: {str(e)}"
-        print(error_msg)
-        traceback.print_exc()
+        log.exception(error_msg)
         return False, error_msg
 
 # Exemplo de uso
 if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     processor = get_document_processor()
-    print("Documentos carregados:", len(processor.get_document_list()))
+    log.info("Documentos carregados: %d", len(processor.get_document_list()))
     
     # Exemplo de como adicionar um documento (descomente para testar)
     # doc_id = processor.add_document("caminho/para/documento.pdf", "Título do Documento", "Descrição opcional")
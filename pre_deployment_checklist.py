@@ -9,8 +9,7 @@ Este script verifica se tudo está pronto para o deployment:
 """
 import os
 import sys
-import importlib
-import pkg_resources
+from importlib.metadata import version, PackageNotFoundError
 
 def check_dependencies():
     """Verifica se todas as dependências necessárias estão instaladas."""
@@ -36,17 +35,8 @@ def check_dependencies():
     
     for package, required_version in required_packages.items():
         try:
-            # Verificar se o pacote está instalado
-            imported = importlib.import_module(package.replace("-", "_"))
-            
-            # Obter a versão instalada
-            try:
-                installed_version = imported.__version__
-            except AttributeError:
-                try:
-                    installed_version = pkg_resources.get_distribution(package).version
-                except:
-                    installed_version = "Desconhecida"
+            # Obter a versão instalada a partir dos metadados, sem importar o pacote
+            installed_version = version(package)
             
             # Verificar versão mínima
             if ">" in required_version:
@@ -64,7 +54,7 @@ def check_dependencies():
                 version_mismatch.append(package)
                 all_dependencies_met = False
                 
-        except ImportError:
+        except PackageNotFoundError:
             print(f"[ERRO] {package} - Não instalado")
             missing_packages.append(package)
             all_dependencies_met = False